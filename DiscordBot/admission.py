@@ -0,0 +1,90 @@
+# admission.py
+import asyncio
+from dispatcher import TokenBucket
+
+
+class AdmissionControl:
+    """
+    Bounded queue in front of auto-report work (avatar search, report creation) so a raid can't pile up unbounded
+    work. Each user and each channel gets a token bucket; flagged messages beyond a bucket's rate are shed, as is
+    anything that arrives while the queue is full. Once the backlog passes degraded_depth the bot runs degraded:
+    reports are still filed from the text score, but the avatar and image checks are skipped until it catches up.
+    """
+    PRUNE_EVERY = 1000 # Submissions between sweeps of idle buckets
+
+    def __init__(self, handler, settings):
+        self.handler = handler # Coroutine function called with each admitted item
+        self.settings = settings
+        self.queue = asyncio.Queue(maxsize=settings["max_queue"])
+        self.user_buckets = {}
+        self.channel_buckets = {}
+        self.workers = []
+        self.degraded = False
+        self.submitted = 0
+        self.stats = {"admitted": 0, "shed_user_rate": 0, "shed_channel_rate": 0, "shed_queue_full": 0, "degraded_items": 0,
+                      "skipped_image_scans": 0}
+
+    def start(self):
+        if self.workers:
+            return
+        for _ in range(self.settings["workers"]):
+            self.workers.append(asyncio.create_task(self._worker()))
+
+    def submit(self, message, *args):
+        """
+        This function queues auto-report work for a flagged message unless it has to be shed.
+        :return: True if the work was queued
+        """
+        self.submitted += 1
+        if self.submitted % self.PRUNE_EVERY == 0:
+            self._prune()
+        if not self._bucket(self.user_buckets, message.author.id, "user").try_acquire():
+            self.stats["shed_user_rate"] += 1
+            return False
+        if not self._bucket(self.channel_buckets, message.channel.id, "channel").try_acquire():
+            self.stats["shed_channel_rate"] += 1
+            return False
+        try:
+            self.queue.put_nowait((message, args))
+        except asyncio.QueueFull:
+            self.stats["shed_queue_full"] += 1
+            return False
+        self.stats["admitted"] += 1
+        self._update_mode()
+        return True
+
+    def status(self):
+        reply = f"Mode: {'degraded (avatar and image checks skipped)' if self.degraded else 'normal'}\n"
+        reply += f"Queue depth: {self.queue.qsize()}/{self.queue.maxsize} (degraded at {self.settings['degraded_depth']})\n"
+        reply += "\n".join(f"{key.replace('_', ' ').capitalize()}: {value}" for key, value in self.stats.items())
+        return reply
+
+    async def _worker(self):
+        while True:
+            message, args = await self.queue.get()
+            self._update_mode()
+            if self.degraded:
+                self.stats["degraded_items"] += 1
+            try:
+                await self.handler(message, *args, degraded=self.degraded)
+            except Exception as e:
+                print(f"Auto-report for message {message.id} failed: {e!r}")
+            finally:
+                self.queue.task_done()
+
+    def _update_mode(self):
+        degraded = self.queue.qsize() >= self.settings["degraded_depth"]
+        if degraded != self.degraded:
+            self.degraded = degraded
+            print(f"Admission control {'entered' if degraded else 'left'} degraded mode at queue depth {self.queue.qsize()}. Stats: {self.stats}")
+
+    def _bucket(self, buckets, key, kind):
+        if key not in buckets:
+            buckets[key] = TokenBucket(self.settings[f"{kind}_rate"], self.settings[f"{kind}_burst"])
+        return buckets[key]
+
+    def _prune(self):
+        # A bucket that has refilled completely holds no state worth keeping
+        for buckets in (self.user_buckets, self.channel_buckets):
+            for key in [k for k, b in buckets.items() if b.full()]:
+                del buckets[key]
@@ -0,0 +1,139 @@
+# attachments.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import aiohttp
+from avatar_store import decode_image, same_image
+import image_hash
+
+
+class ScanResult:
+    def __init__(self):
+        self.hashes = [] # Hashes of every image that could be read
+        self.known_bad = False # An image matched the known-bad image list
+        self.avatar_match_id = None # ID of a member whose profile photo appears in the message, confirmed pixel by pixel
+
+    def flagged(self):
+        return self.known_bad or self.avatar_match_id != None
+
+
+class AttachmentScanner:
+    """
+    Scans images attached to or embedded in messages. Images are streamed into memory with a size cap (never written to
+    disk), hashed on a worker pool so text scoring isn't held up, and compared against the hashes of member profile
+    photos and a list of known scam images. Only Discord's own CDN and media proxy are ever fetched from, never a host
+    named by the poster, and at most MAX_SCANS messages are scanned at once.
+    """
+    MAX_BYTES = 8 * 1024 * 1024
+    MAX_IMAGES = 4 # Per message
+    MAX_SCANS = 4 # Messages scanned at once; more are left unscanned
+    WORKERS = 2
+    ALLOWED_HOSTS = {"cdn.discordapp.com", "media.discordapp.net"}
+    BAD_HASHES_PATH = "bad_image_hashes.txt"
+
+    def __init__(self, client):
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="image-scan")
+        self.session = None
+        self.bad_hashes = image_hash.load_hashes(self.BAD_HASHES_PATH)
+        self.avatar_hashes = {} # Map from member ID to (avatar key, hash of that avatar)
+        self.scans = asyncio.Semaphore(self.MAX_SCANS)
+
+    def image_urls(self, message):
+        urls = []
+        for attachment in message.attachments:
+            if attachment.content_type and attachment.content_type.startswith("image/") and attachment.size <= self.MAX_BYTES:
+                urls.append(attachment.url)
+        # Embed images are fetched through Discord's media proxy, not from the site the poster linked
+        for embed in message.embeds:
+            for image in (embed.image, embed.thumbnail):
+                if image and image.proxy_url:
+                    urls.append(image.proxy_url)
+        urls = [url for url in urls if urlsplit(url).scheme == "https" and urlsplit(url).hostname in self.ALLOWED_HOSTS]
+        return urls[:self.MAX_IMAGES]
+
+    def busy(self):
+        return self.scans.locked()
+
+    async def scan(self, message):
+        result = ScanResult()
+        urls = self.image_urls(message)
+        async with self.scans:
+            images = await asyncio.gather(*(self.decode_url(url) for url in urls))
+        for image in images:
+            if image == None:
+                continue
+            result.hashes.append(image.hash)
+            # Screenshots and other near-uniform images hash close to each other whatever they show
+            if not image_hash.informative(image.hash):
+                continue
+            if any(image_hash.hamming(image.hash, bad) <= image_hash.MATCH_DISTANCE for bad in self.bad_hashes):
+                result.known_bad = True
+            if result.avatar_match_id == None:
+                result.avatar_match_id = await self.find_avatar(image, exclude=message.author.id)
+        return result
+
+    async def find_avatar(self, image, exclude=None):
+        """
+        This function finds a member whose profile photo is the given image. Hashes pick the candidates; each one is
+        confirmed against the avatar's pixels before it counts.
+        :param image: The posted image's decoded AvatarEntry
+        :return: the member's ID, or None
+        """
+        for member_id, (key, avatar_hash) in list(self.avatar_hashes.items()):
+            if member_id == exclude or image_hash.hamming(image.hash, avatar_hash) > image_hash.MATCH_DISTANCE:
+                continue
+            member = self.client.members.get(member_id)
+            if member == None or member.avatar_key != key:
+                continue
+            avatar = await self.client.avatar_store.get(self.client.members.avatar(member))
+            if avatar != None and same_image(image, avatar):
+                return member_id
+        return None
+
+    async def index_avatar(self, member):
+        """
+        This function hashes a member's profile photo so it can be matched against images posted in messages.
+        Nothing is downloaded if the avatar hasn't changed since it was last hashed.
+        :param member: The member's MemberInfo
+        """
+        if not member.avatar_key:
+            self.avatar_hashes.pop(member.id, None)
+            return
+        if member.id in self.avatar_hashes and self.avatar_hashes[member.id][0] == member.avatar_key:
+            return
+        entry = await self.client.avatar_store.get(self.client.members.avatar(member))
+        if entry != None:
+            self.avatar_hashes[member.id] = (member.avatar_key, entry.hash)
+
+    async def decode_url(self, url):
+        data = await self.download(url)
+        if data == None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(self.executor, decode_image, data)
+
+    async def download(self, url):
+        """
+        This function streams a file into memory, giving up once it passes MAX_BYTES.
+        :return: the file contents, or None if it couldn't be downloaded or was too large
+        """
+        if self.session == None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        try:
+            async with self.session.get(url, allow_redirects=False) as response:
+                if response.status != 200 or (response.content_length or 0) > self.MAX_BYTES:
+                    return None
+                data = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    data += chunk
+                    if len(data) > self.MAX_BYTES:
+                        return None
+                return bytes(data)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Failed to download image {url}: {e}")
+            return None
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+        self.executor.shutdown(wait=False)
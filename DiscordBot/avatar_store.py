@@ -0,0 +1,164 @@
+# avatar_store.py
+import asyncio
+from collections import OrderedDict
+from io import BytesIO
+import os
+import re
+import discord
+import numpy as np
+from PIL import Image
+import image_hash
+
+
+class AvatarEntry:
+    __slots__ = ("key", "pixels", "hash")
+
+    def __init__(self, key, pixels, hash):
+        self.key = key
+        self.pixels = pixels # Downsampled RGB pixels as a SIZE x SIZE x 3 uint8 array
+        self.hash = hash # Difference hash of the full avatar
+
+
+def decode_avatar(key, data, size):
+    """
+    This function turns downloaded avatar bytes into a store entry. It is safe to run on a worker thread.
+    """
+    with Image.open(BytesIO(data)) as image:
+        image.seek(0) # First frame of animated avatars
+        h = image_hash.dhash(image)
+        pixels = np.asarray(image.convert('RGB').resize((size, size)), dtype=np.uint8)
+    return AvatarEntry(key, pixels, h)
+
+
+def decode_image(data):
+    """
+    This function decodes a posted image the same way as an avatar, so the two can be compared.
+    :return: an AvatarEntry without a key, or None if the bytes aren't a readable image
+    """
+    try:
+        return decode_avatar(None, data, AvatarStore.SIZE)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def same_image(a, b):
+    """
+    This function confirms that two decoded images whose hashes are close really are the same picture, by comparing
+    their downsampled pixels.
+    """
+    difference = a.pixels.astype(np.int32) - b.pixels
+    return np.mean(difference ** 2) < AvatarStore.MAX_MEAN_SQUARED_ERROR
+
+
+class AvatarStore:
+    """
+    Content-addressed store of decoded avatars, keyed by the avatar key (hash) Discord puts on each Asset. The key
+    changes whenever a user changes their avatar, so an entry never goes stale: a member is only downloaded again
+    after their key changes. Recently used entries are kept in memory (LRU); everything else is read back from disk.
+    The disk tier is an LRU too, capped at DISK_ENTRIES files, so avatars members have since replaced age out.
+    """
+    SIZE = 64 # Width and height of the stored pixels
+    DOWNLOAD_SIZE = 256 # Size requested from the CDN
+    MAX_MEAN_SQUARED_ERROR = 64 # Per channel, between the downsampled pixels of two copies of the same picture
+    MEMORY_ENTRIES = 1024
+    DISK_ENTRIES = 20000 # About 12 KB each
+    PATH = "avatar_cache"
+
+    def __init__(self, path=PATH, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.memory = OrderedDict() # Map from avatar key to AvatarEntry, least recently used first
+        self.pending = {} # Map from avatar key to the in-flight load of that avatar
+        os.makedirs(self.path, exist_ok=True)
+        self.disk = self._scan_disk() # Avatar keys stored on disk, least recently used first
+
+    async def get(self, asset):
+        """
+        This function returns the decoded avatar for an Asset, downloading it only if it isn't in memory or on disk.
+        :return: the AvatarEntry, or None if the avatar couldn't be downloaded or decoded
+        """
+        key = asset.key
+        entry = self.memory.get(key)
+        if entry:
+            self.memory.move_to_end(key)
+            return entry
+        # Another scan is already loading this avatar
+        if key in self.pending:
+            return await asyncio.shield(self.pending[key])
+        task = asyncio.create_task(self._load(asset))
+        self.pending[key] = task
+        task.add_done_callback(lambda _: self.pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, asset):
+        loop = asyncio.get_running_loop()
+        entry = None
+        if asset.key in self.disk:
+            entry = await loop.run_in_executor(None, self._read_disk, asset.key)
+            if entry != None:
+                self.disk.move_to_end(asset.key)
+            else:
+                self.disk.pop(asset.key, None)
+        if entry == None:
+            try:
+                data = await asset.replace(size=self.DOWNLOAD_SIZE, static_format='png').read()
+                entry = await loop.run_in_executor(None, decode_avatar, asset.key, data, self.SIZE)
+            except (discord.HTTPException, OSError, ValueError, Image.DecompressionBombError) as e:
+                print(f"Failed to load avatar {asset.key}: {e}")
+                return None
+            # The entry is still good without its disk copy; it will just be downloaded again next time
+            try:
+                await loop.run_in_executor(None, self._write_disk, entry)
+                self.disk[entry.key] = None
+                self._evict_disk()
+            except OSError as e:
+                print(f"Failed to cache avatar {asset.key} on disk: {e}")
+        self._remember(entry)
+        return entry
+
+    def _remember(self, entry):
+        self.memory[entry.key] = entry
+        self.memory.move_to_end(entry.key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _scan_disk(self):
+        # Files are touched whenever they are read, so modification time gives the least recently used order
+        stored = []
+        for name in os.listdir(self.path):
+            if name.endswith('.npz'):
+                stored.append((os.path.getmtime(os.path.join(self.path, name)), name[:-len('.npz')]))
+        return OrderedDict((key, None) for _, key in sorted(stored))
+
+    def _evict_disk(self):
+        while len(self.disk) > self.disk_entries:
+            key, _ = self.disk.popitem(last=False)
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+
+    def _file(self, key):
+        # Avatar keys are hex digests, optionally prefixed with a_ for animated avatars
+        return os.path.join(self.path, re.sub('[^0-9A-Za-z_]', '', key) + '.npz')
+
+    def _read_disk(self, key):
+        try:
+            with np.load(self._file(key)) as data:
+                entry = AvatarEntry(key, data['pixels'], int(data['hash']))
+            os.utime(self._file(key))
+            return entry
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, entry):
+        tmp_path = self._file(entry.key) + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, pixels=entry.pixels, hash=np.uint64(entry.hash))
+            os.replace(tmp_path, self._file(entry.key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
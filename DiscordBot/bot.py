@@ -1,6 +1,7 @@
 # bot.py
 import discord
 from discord.ext import commands
+import asyncio
 import os
 import json
 import logging
@@ -9,6 +10,24 @@ import requests
 from report import Report
 from report import State
 from moderator import Moderate
+from moderator import campaign_reports, enforce
+from name_index import NameIndex
+from cache import FetchCache
+from attachments import AttachmentScanner
+from avatar_store import AvatarStore
+from dispatcher import ActionDispatcher
+from digest import Digest
+from config import load_config
+from sessions import SessionStore, save_json, load_json
+from routing import ChannelRouter, MONITORED, MOD
+from shadow import ShadowScorer
+from admission import AdmissionControl
+from velocity import VelocityTracker
+from events import EventLog, compact as compact_events
+from search import ReportSearch
+from clusters import ClusterIndex
+from members import MemberDirectory
+from memory import MemoryReport
 from sklearn.metrics import confusion_matrix
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -43,18 +62,87 @@ class ModBot(discord.Client):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.members = True
-        super().__init__(command_prefix='.', intents=intents)
+        self.config = load_config()
+        self.memory = MemoryReport(self, self.config["memory"]) # Memory use by subsystem for `!memory`
+        self.members = MemberDirectory(self, self.config["members"]) # ID, name, display name and avatar of every member
+        super().__init__(command_prefix='.', intents=intents, member_cache_flags=self.members.cache_flags(),
+                         chunk_guilds_at_startup=self.members.chunk_at_startup())
         self.group_num = None
-        self.mod_channels = {} # Map from guild to the mod channel id for that guild
-        self.reports = {} # Map from user IDs to the state of their report
-        self.moderations = {} # Map from report (message) ID to the state of the moderation
+        self.members_loaded = False # Set once the member directory and indexes are built; on_ready fires again on reconnects
+        self.router = ChannelRouter(self.config["routing"]) # Map from channel ID to how we handle messages there
+        self.mod_channels = self.router.mod_channels # Map from guild to the mod channel for that guild
+        sessions = self.config["sessions"]
+        self.reports = SessionStore(sessions["idle_ttl_seconds"], sessions["max_sessions"]) # Map from user IDs to the state of their report
+        self.moderations = SessionStore(sessions["idle_ttl_seconds"], sessions["max_sessions"]) # Map from moderator IDs to the state of their moderation
         self.reported_items = [] # List of reports
-        self.watchlist = {}
+        self.bulk_previews = {} # Map from moderator ID to the (verdict, seed report ID, report IDs) of their last `!bulk` preview
+        self.events = EventLog(self.config["events"]) # Append-only log of reports, scores and verdicts for analysis
+        self.search = ReportSearch(self.config["search"]["path"]) # Full-text index of every report ever filed
+        self.next_report_id = self.search.last_report_id() + 1
+        self.watchlist = {} # Map from user ID to their reports, oldest entry first
+        self.velocity = VelocityTracker(self.config["velocity"]) # Recent message rate and scores per user
+        self.name_index = NameIndex() # Look-alike name search over every member the bot can see
+        self.clusters = ClusterIndex(self.config["clusters"]) # Groups of accounts that look linked
+        self.fetch_cache = FetchCache(self) # Cached user and message lookups for the report and moderation flows
+        self.avatar_store = AvatarStore() # Decoded profile photos keyed by Discord's avatar hash
+        self.attachment_scanner = AttachmentScanner(self) # Image checks for attachments in the "group-#" channel
+        self.dispatcher = ActionDispatcher(self) # Rate-limited queue for DMs, bans and mod channel notices
+        self.digest = Digest(self, self.config["digest"]) # Periodic summary of new reports for the mod channel
+        self.admission = AdmissionControl(self.file_auto_report, self.config["admission"]) # Bounded queue for auto-report work
 
         # Initialize classifier.
         self.classifier = LogisticRegression()
         self.vectorizer = TfidfVectorizer(stop_words="english")
         self.lb = preprocessing.LabelBinarizer()
+        self.shadow = ShadowScorer(self.config["shadow"]) # Candidate models scored alongside the live one
+
+
+    async def setup_hook(self):
+        # Resume any actions and reporting flows that were still in progress when the bot last stopped
+        self.dispatcher.start()
+        self.digest.start()
+        self.admission.start()
+        self.restore_state()
+        asyncio.create_task(self.maintain_sessions())
+
+
+    async def maintain_sessions(self):
+        # Periodically drop abandoned flows and save what's left so it survives a restart
+        while True:
+            await asyncio.sleep(self.config["sessions"]["snapshot_seconds"])
+            evicted = self.reports.evict_idle() + self.moderations.evict_idle()
+            if evicted:
+                print(f"Evicted {evicted} idle report/moderation session(s).")
+            self.clusters.expire()
+            self.save_state()
+            self.events.flush()
+
+
+    def save_state(self):
+        save_json(self.config["sessions"]["path"], {
+            "next_report_id": self.next_report_id,
+            "reported_items": self.reported_items,
+            "watchlist": {str(user_id): reports for user_id, reports in self.watchlist.items()},
+            "reports": self.reports.snapshot(),
+            "moderations": self.moderations.snapshot(),
+        })
+
+
+    def restore_state(self):
+        state = load_json(self.config["sessions"]["path"])
+        if state == None:
+            return
+        self.next_report_id = max(self.next_report_id, state["next_report_id"])
+        self.reported_items = []
+        for report in state["reported_items"]:
+            self.queue_report(report)
+        self.watchlist = {}
+        for user_id, reports in state["watchlist"].items():
+            self.add_to_watchlist(int(user_id), reports)
+        # Moderations refer to reports by ID, so restore them after the report queue
+        self.reports.restore(state["reports"], lambda data: Report.from_snapshot(self, data))
+        self.moderations.restore(state["moderations"], lambda data: Moderate.from_snapshot(self, data))
+        print(f'Restored {len(self.reports)} report(s) and {len(self.moderations)} moderation(s) in progress.')
 
 
     async def on_ready(self):
@@ -72,12 +160,106 @@ class ModBot(discord.Client):
         else:
             raise Exception("Group number not found in bot's name. Name format should be \"Group # Bot\".")
 
-        # Find the mod channel in each guild that this bot should report to
-        for guild in self.guilds:
-            for channel in guild.text_channels:
-                if channel.name == f'group-{self.group_num}-mod':
-                    self.mod_channels[guild.id] = channel
-        
+        # Find the monitored channels and the mod channel in each guild
+        self.router.build(self.guilds, self.group_num)
+
+        # Members who join or change their profile while the bot is connected are picked up by the event handlers,
+        # so the full load only happens on the first connection
+        if not self.members_loaded:
+            self.members_loaded = True
+            await self.load_members(self.guilds)
+            print(f'Loaded {len(self.members)} member(s) with the {self.members.policy} member cache policy.')
+
+
+    async def load_members(self, guilds):
+        # Load the guilds' members, then index their names for impersonation victim detection
+        known = set(self.members.members)
+        await self.members.load(guilds)
+        added = [member for member in self.members if member.id not in known]
+        for i, member in enumerate(added):
+            self.name_index.add_member(member)
+            # Let the gateway heartbeat and other events through on large guilds
+            if i % 1000 == 999:
+                await asyncio.sleep(0)
+
+        # Hash every member's profile photo in the background so images reusing them can be recognized
+        asyncio.create_task(self.index_avatars(added))
+
+
+    async def index_avatars(self, members):
+        for member in members:
+            await self.attachment_scanner.index_avatar(member)
+        print(f'Finished indexing {len(members)} profile photo(s).')
+
+
+    async def close(self):
+        self.save_state()
+        self.events.flush()
+        await self.attachment_scanner.close()
+        await super().close()
+
+
+    async def on_guild_join(self, guild):
+        self.router.add_guild(guild)
+        await self.load_members([guild])
+
+
+    async def on_guild_remove(self, guild):
+        self.router.remove_guild(guild)
+
+
+    async def on_guild_channel_create(self, channel):
+        self.router.channel_added(channel)
+
+
+    async def on_guild_channel_update(self, before, after):
+        self.router.channel_added(after)
+
+
+    async def on_guild_channel_delete(self, channel):
+        self.router.channel_removed(channel)
+
+
+    async def on_member_join(self, member):
+        if member.joined_at:
+            self.clusters.add_join(member.id, member.joined_at)
+        await self.refresh_member(member)
+
+
+    async def on_raw_member_remove(self, payload):
+        # Dispatched whether or not discord.py cached the member. The member may still be in another guild the bot is in
+        if self.members.remove(payload.user.id, payload.guild_id):
+            self.name_index.remove_member(payload.user.id)
+            self.attachment_scanner.avatar_hashes.pop(payload.user.id, None)
+
+
+    async def on_member_update(self, before, after):
+        # Only dispatched for cached members; under the compact policy members are refreshed from their messages
+        await self.refresh_member(after)
+
+
+    async def on_user_update(self, before, after):
+        await self.refresh_member(after)
+
+
+    async def refresh_member(self, member):
+        '''
+        Updates the member directory and re-indexes the member's names and avatar if any of them changed.
+        '''
+        if not self.members.add(member):
+            return
+        info = self.members.get(member.id)
+        self.name_index.add_member(info)
+        await self.attachment_scanner.index_avatar(info)
+
+
+    async def on_raw_message_delete(self, payload):
+        self.fetch_cache.invalidate("message", payload.channel_id, payload.message_id)
+
+
+    async def on_raw_message_edit(self, payload):
+        self.fetch_cache.invalidate("message", payload.channel_id, payload.message_id)
+
 
     async def on_message(self, message):
         '''
@@ -113,88 +295,293 @@ class ModBot(discord.Client):
         # If we don't currently have an active report for this user, add one
         if author_id not in self.reports:
             self.reports[author_id] = Report(self)
+        report = self.reports[author_id]
 
         # Let the report class handle this message; forward all the messages it returns to us
         if message.content.lower().startswith(Report.BLOCK_KEYWORD):
-            self.reports[author_id].state = State.BLOCK_START
-        responses = await self.reports[author_id].handle_message(message)
+            report.state = State.BLOCK_START
+        responses = await report.handle_message(message)
         for r in responses:
             await message.channel.send(r)
 
         # If the report is complete, add it to the list of reports and remove it from our map
-        if self.reports[author_id].report_complete():
-            self.reported_items.append(self.reports[author_id].REPORT_INFO_DICT.copy())
-            self.reports[author_id].REPORT_INFO_DICT.clear()
+        if report.report_complete():
+            self.add_report(report.REPORT_INFO_DICT.copy())
             self.reports.pop(author_id)
         
         # If the report is cancelled, remove it from our map
-        elif self.reports[author_id].report_cancelled():
+        elif report.report_cancelled():
             self.reports.pop(author_id)
 
         return
 
 
     async def handle_channel_message(self, message):
-        # Only handle messages sent in the "group-#" and "group-#-mod" channels
-        if not message.channel.name == f'group-{self.group_num}' and not message.channel.name == f'group-{self.group_num}-mod':
+        # Only handle messages sent in monitored channels and the mod channel
+        route = self.router.route(message.channel.id)
+
+        # Messages in other channels still count towards the sender's activity, so bursts across channels are seen
+        if route == None:
+            self.velocity.note(message.author.id, message.channel.id)
             return
         
-        # Check each message in the "group-#" channel for impersonation and handle accordingly
-        if message.channel.name == f'group-{self.group_num}':
+        # Check each message in a monitored channel for impersonation and handle accordingly
+        if route.kind == MONITORED:
+            if isinstance(message.author, discord.Member):
+                await self.refresh_member(message.author)
             eval = self.eval_text(message)
-            if eval > 0.5 or (eval > 0.4 and message.author.id in self.watchlist.keys()):
-                self.reports[0] = Report(self)
-                await self.reports[0].auto_report(message, eval)
-                if self.reports[0].report_complete():
-                    self.reported_items.append(self.reports[0].REPORT_INFO_DICT.copy())
-                    self.reports[0].REPORT_INFO_DICT.clear()
-                    self.reports.pop(0)
+            activity = self.velocity.record(message.author.id, message.channel.id, eval)
+            # Check attached and embedded images for known scam images or reused profile photos, unless we're behind
+            scan = None
+            if not self.admission.degraded and self.attachment_scanner.image_urls(message):
+                if self.attachment_scanner.busy():
+                    self.admission.stats["skipped_image_scans"] += 1
+                else:
+                    scan = await self.attachment_scanner.scan(message)
+            # Users posting in bursts across several channels get the lower watchlist threshold, and are flagged if
+            # their recent messages score high on average even when this one doesn't
+            bursting = self.velocity.bursting(activity)
+            threshold = route.watchlist_threshold if message.author.id in self.watchlist.keys() or bursting else route.threshold
+            flagged = eval > threshold or (bursting and activity.mean_score > threshold) or (scan and scan.flagged())
+            self.shadow.observe(message, eval, threshold, bool(flagged))
+            self.events.log_score(message, eval, threshold, bool(flagged))
+            self.clusters.add_message(message, eval, bool(flagged))
+            if flagged:
+                self.admission.submit(message, eval, scan, activity if bursting else None)
 
         # Handle mod messages while moderating reports.
-        elif message.channel.name == f'group-{self.group_num}-mod':
+        elif route.kind == MOD:
             moderator_id = message.author.id
             responses = []
 
+            # Apply one verdict to a whole campaign of reports
+            if message.content.lower().startswith(Moderate.BULK_KEYWORD):
+                await self.handle_bulk_command(message)
+                return
+
+            # Search all past reports
+            if message.content.lower().startswith(ReportSearch.SEARCH_KEYWORD):
+                await self.handle_search_command(message)
+                return
+
+            # Compact the event log to Parquet for analysis
+            if message.content.lower() == Moderate.EXPORT_KEYWORD:
+                await self.handle_export_command(message)
+                return
+
+            # Show memory use by subsystem
+            if message.content.lower() == MemoryReport.MEMORY_KEYWORD:
+                await message.channel.send(self.memory.format())
+                return
+
+            # Show queue depth and shed counts for auto-reports
+            if message.content.lower() == Moderate.LOAD_KEYWORD:
+                await message.channel.send(self.admission.status())
+                return
+
             # Only respond to messages if they're part of a moderation flow
-            if moderator_id not in self.moderations and not message.content.lower().startswith(Moderate.START_KEYWORD):
+            opening = message.content.lower().startswith(Digest.OPEN_KEYWORD)
+            if moderator_id not in self.moderations and not message.content.lower().startswith(Moderate.START_KEYWORD) and not opening:
                 return
 
             # If we don't currently have an active moderation for this report, add one
             if moderator_id not in self.moderations:
+                # `!open <report ID>` picks a report from a digest; `!start` takes the next one in the queue
+                if opening:
+                    report = self.find_report(message.content[len(Digest.OPEN_KEYWORD):].strip())
+                    if report == None:
+                        await message.channel.send("That report ID isn't in the moderation queue. Please check the ID and try again.")
+                        return
                 self.moderations[moderator_id] = Moderate(self)
-                if len(self.reported_items) > 0:
+                if opening:
+                    self.moderations[moderator_id].report = report
+                elif len(self.reported_items) > 0:
                     self.moderations[moderator_id].report = self.reported_items[0]
+            moderation = self.moderations[moderator_id]
 
             # Let the moderation class handle this message; forward all the messages it returns to us
-            responses = await self.moderations[moderator_id].handle_message(message)
+            responses = await moderation.handle_message(message)
             for r in responses:
                 await message.channel.send(r)
 
             # If the moderation is complete, remove it from our map
-            if self.moderations[moderator_id].moderation_complete():
+            if moderation.moderation_complete():
                 # Update watch list if needed
-                if self.moderations[moderator_id].watch != "":
-                    if self.moderations[moderator_id].watch not in self.watchlist.keys():
-                        self.watchlist[self.moderations[moderator_id].watch] = [self.moderations[moderator_id].report]
-                    else:
-                        self.watchlist[self.moderations[moderator_id].watch].append(self.moderations[moderator_id].report)
+                if moderation.watch != "":
+                    self.add_to_watchlist(moderation.watch, [moderation.report])
+                self.record_verdict(moderation.report, moderation.verdict)
                 # Remove the moderation instance and report from our map
                 self.moderations.pop(moderator_id)
-                self.reported_items = self.reported_items[1:]
+                self.reported_items = [r for r in self.reported_items if r is not moderation.report]
             
             # If the moderation is cancelled, remove it from our map
-            elif self.moderations[moderator_id].moderation_cancelled():
+            elif moderation.moderation_cancelled():
                 self.moderations.pop(moderator_id)
 
-        # Forward the message to the mod channel with evaluation scores in Milestone 3
-        # mod_channel = self.mod_channels[message.guild.id]
-        # await mod_channel.send(f'Forwarded message:\n{message.author.name}: "{message.content}"')
-        # scores = self.eval_text(message.content)
-        # await mod_channel.send(self.code_format(scores))
-
         return
 
+
+    async def file_auto_report(self, message, eval, scan, activity, degraded=False):
+        # Called by admission control for each flagged message it admits
+        report = Report(self)
+        await report.auto_report(message, eval, scan, search_avatar=not degraded)
+        if activity != None:
+            report.REPORT_INFO_DICT["Recent activity"] = activity.describe(self.velocity.window)
+        linked, reasons = self.clusters.cluster(message.author.id)
+        if len(linked) > 1:
+            report.REPORT_INFO_DICT["Linked accounts"] = f"{len(linked) - 1} (shared {', '.join(sorted(reasons))})"
+        if report.report_complete():
+            self.add_report(report.REPORT_INFO_DICT, message.guild.id)
+
+
+    def add_report(self, report, guild_id=None):
+        '''
+        Adds a finished report to the moderation queue and to the next mod channel digest.
+        '''
+        report["Report ID"] = self.next_report_id
+        self.next_report_id += 1
+        self.queue_report(report)
+
+        # Reports of a message belong to that message's guild; profile reports go to every mod channel
+        if guild_id == None and "Offending message link" in report:
+            m = re.search('/(\d+)/(\d+)/(\d+)', report["Offending message link"])
+            if m:
+                guild_id = int(m.group(1))
+        for mod_guild_id in ([guild_id] if guild_id != None else self.mod_channels.keys()):
+            self.digest.add(mod_guild_id, report)
+        self.events.log_report(report, guild_id)
+        self.search.add(report)
+
+
+    def queue_report(self, report):
+        # The oldest reports are dropped from a full queue; they can still be found with `!search`
+        self.reported_items.append(report)
+        limit = self.config["sessions"]["max_queued_reports"]
+        if len(self.reported_items) > limit:
+            in_progress = [m.report for m in self.moderations.values()]
+            dropped = [r for r in self.reported_items[:-limit] if not any(r is p for p in in_progress)]
+            self.reported_items = [r for r in self.reported_items if not any(r is d for d in dropped)]
+            print(f"Moderation queue is full; dropped {len(dropped)} report(s), oldest first.")
+
+
+    def add_to_watchlist(self, user_id, reports):
+        # Users are kept most recently watched last, so the longest-watched user goes first once the watchlist is full
+        limits = self.config["sessions"]
+        kept = self.watchlist.pop(user_id, []) + list(reports)
+        self.watchlist[user_id] = kept[-limits["max_watchlist_reports"]:]
+        while len(self.watchlist) > limits["max_watchlist_users"]:
+            del self.watchlist[next(iter(self.watchlist))]
+
+
+    def record_verdict(self, report, verdict):
+        if verdict == None:
+            return
+        self.shadow.record_outcome(report, verdict)
+        self.events.log_verdict(report, verdict)
+        self.search.set_verdict(report, verdict)
+
+
+    def find_report(self, report_id):
+        for report in self.reported_items:
+            if str(report["Report ID"]) == report_id.lstrip("#"):
+                return report
+        return None
+
     
+    async def handle_bulk_command(self, message):
+        '''
+        `!bulk <verdict> [#<report ID>]` shows every queued report in the same campaign as the given report, or as the
+        next report in the queue. `!bulk <verdict> #<report ID> confirm` applies the verdict to all of their offenders
+        and removes the reports from the queue, provided the campaign is still exactly what that moderator was shown.
+        '''
+        args = message.content.lower().split()
+        seed_id = next((a for a in args[2:] if a.startswith("#")), None)
+        confirm = "confirm" in args[2:]
+        if len(args) < 2 or args[1] not in Moderate.BULK_VERDICTS or (confirm and seed_id == None):
+            await message.channel.send("Usage: `" + Moderate.BULK_KEYWORD + " <" + "|".join(Moderate.BULK_VERDICTS) + "> [#<report ID> [confirm]]`")
+            return
+
+        # Leave out reports another moderator is already working on
+        in_progress = [m.report for m in self.moderations.values()]
+        queue = [r for r in self.reported_items if not any(r is p for p in in_progress)]
+        if seed_id != None:
+            seed = next((r for r in queue if str(r["Report ID"]) == seed_id.lstrip("#")), None)
+            if seed == None:
+                await message.channel.send("That report ID isn't in the moderation queue, or another moderator is working on it.")
+                return
+        elif len(queue) == 0:
+            await message.channel.send("There are currently no reports to review.")
+            return
+        else:
+            seed = queue[0]
+
+        verdict = args[1]
+        campaign = campaign_reports(queue, seed)
+        campaign_ids = sorted(r["Report ID"] for r in campaign)
+        offenders = {}
+        for report in campaign:
+            offenders.setdefault(report["Offending user ID"], report["Offending username"])
+
+        # Only apply the verdict to the reports this moderator was shown; anything else gets a fresh preview
+        if confirm and self.bulk_previews.get(message.author.id) == (verdict, seed["Report ID"], campaign_ids):
+            del self.bulk_previews[message.author.id]
+            group = self.dispatcher.new_group()
+            for user_id in offenders:
+                if verdict != "dismiss":
+                    enforce(self, user_id, verdict, group)
+            for report in campaign:
+                self.record_verdict(report, verdict)
+            self.reported_items = [r for r in self.reported_items if not any(r is c for c in campaign)]
+            await message.channel.send(f"Applied `{verdict}` to {len(offenders)} account(s) from {len(campaign)} report(s).")
+            return
+
+        self.bulk_previews[message.author.id] = (verdict, seed["Report ID"], campaign_ids)
+        reply = "The campaign has changed since you last looked at it.\n" if confirm else ""
+        reply += f"{len(campaign)} report(s) against {len(offenders)} account(s) belong to the campaign of report #{seed['Report ID']}:\n"
+        reply += "\n".join(f"- `{name}` ({user_id})" for user_id, name in offenders.items())
+        # Accounts linked to the seed offender without a report of their own are listed for review, never enforced
+        linked, reasons = self.clusters.cluster(seed["Offending user ID"])
+        unreported = [user_id for user_id in sorted(linked) if user_id not in offenders]
+        if unreported:
+            reply += f"\n\n{len(unreported)} unreported account(s) are linked to the offender of report #{seed['Report ID']} by shared {', '.join(sorted(reasons))}."
+            reply += " They are not included; review each one before acting on it:"
+            for user_id in unreported:
+                member = self.members.get(user_id)
+                reply += f"\n- `{member.name if member else 'unknown'}` ({user_id})"
+        footer = f"\n\nSay `{Moderate.BULK_KEYWORD} {verdict} #{seed['Report ID']} confirm` to apply `{verdict}` to all of them."
+        await message.channel.send(reply[:2000 - len(footer)] + footer)
+
+
+    async def handle_search_command(self, message):
+        '''
+        `!search <terms> [page:N]` lists the reports matching every term, best matches first.
+        '''
+        query = message.content[len(ReportSearch.SEARCH_KEYWORD):].strip()
+        page = 1
+        m = re.search(r'\s*\bpage:(\d+)\s*$', query)
+        if m:
+            page = max(1, int(m.group(1)))
+            query = query[:m.start()]
+        if not query:
+            await message.channel.send("Usage: `" + ReportSearch.SEARCH_KEYWORD + " <words, usernames or user IDs> [page:N]`")
+            return
+        # Results quote offending messages, which may contain @everyone or role mentions
+        await message.channel.send(self.search.format_results(query, page), allowed_mentions=discord.AllowedMentions.none())
+
+
+    async def handle_export_command(self, message):
+        self.events.flush()
+        try:
+            compacted = await asyncio.get_running_loop().run_in_executor(None, compact_events, self.events.path, True)
+        except ImportError as e:
+            await message.channel.send(f"Parquet export needs pyarrow installed: {e}")
+            return
+        reply = f"Compacted {len(compacted)} day(s) of events to `{os.path.join(self.events.path, 'parquet')}`."
+        for day, count in compacted:
+            reply += f"\n- {day}: {count} events"
+        await message.channel.send(reply[:2000])
+
+
     def train_classifier(self):
         # Read data in and split into train and test groups.
         data = pd.read_csv('messages_dataset.csv')
@@ -208,6 +595,7 @@ class ModBot(discord.Client):
         X_tfidf_train = self.vectorizer.fit_transform(X_train)
         X_tfidf_test = self.vectorizer.transform(X_test)
         self.classifier.fit(X_tfidf_train, y_train)
+        self.shadow.train(X_train, y_train)
 
         # Print accuracy, precision, recall, and f1 scores.
         accuracy = self.classifier.score(X_tfidf_test, y_test)
@@ -0,0 +1,82 @@
+# cache.py
+import asyncio
+import time
+import discord
+
+
+class FetchCache:
+    """
+    Read-through cache in front of the REST lookups used by the report and moderation flows. Lookups prefer objects
+    already in discord.py's gateway cache, then a local TTL cache, and only then hit the API. A NotFound response is
+    cached for a shorter time so repeated bad input doesn't keep costing requests, and concurrent lookups for the
+    same ID share a single request.
+    """
+    TTL = 300 # Seconds a fetched object is reused
+    NOT_FOUND_TTL = 60 # Seconds a NotFound response is reused
+    MAX_ENTRIES = 5000
+
+    def __init__(self, client):
+        self.client = client
+        self.entries = {} # Map from cache key to (expiry time, object or NotFound exception)
+        self.pending = {} # Map from cache key to the in-flight fetch for that key
+
+    async def get_user(self, user_id):
+        user_id = int(user_id)
+        user = self.client.get_user(user_id)
+        if user:
+            return user
+        return await self._fetch(("user", user_id), lambda: self.client.fetch_user(user_id))
+
+    async def get_message(self, channel, message_id):
+        message_id = int(message_id)
+        message = discord.utils.get(self.client.cached_messages, id=message_id)
+        if message:
+            return message
+        return await self._fetch(("message", channel.id, message_id), lambda: channel.fetch_message(message_id))
+
+    def invalidate(self, *key):
+        self.entries.pop(key, None)
+
+    async def _fetch(self, key, fetch):
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            if isinstance(entry[1], discord.NotFound):
+                raise entry[1]
+            return entry[1]
+
+        # Someone is already fetching this; wait for their result instead of sending another request.
+        if key in self.pending:
+            return await asyncio.shield(self.pending[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            result = await fetch()
+        except discord.NotFound as e:
+            self._store(key, e, self.NOT_FOUND_TTL)
+            future.set_exception(e)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._store(key, result, self.TTL)
+            future.set_result(result)
+            return result
+        finally:
+            self.pending.pop(key, None)
+            if not future.done():
+                # The fetch itself was cancelled; release anyone waiting on it.
+                future.cancel()
+            elif not future.cancelled():
+                # Mark any exception as retrieved in case nobody else was waiting on it.
+                future.exception()
+
+    def _store(self, key, value, ttl):
+        now = time.monotonic()
+        if len(self.entries) >= self.MAX_ENTRIES:
+            self.entries = {k: v for k, v in self.entries.items() if v[0] > now}
+            # Still full of live entries; drop the oldest inserted ones.
+            while len(self.entries) >= self.MAX_ENTRIES:
+                self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (now + ttl, value)
@@ -0,0 +1,111 @@
+# calibrate.py
+"""
+Picks flagging thresholds from the shadow-mode log written by the bot.
+
+For the live classifier and every candidate model, prints the precision, recall and expected reports per hour at each
+threshold, and recommends the lowest threshold that meets a target precision and/or a moderator workload.
+
+    python calibrate.py --target-precision 0.8
+    python calibrate.py --max-reports-per-hour 20 --model bigrams
+
+Only messages the live classifier flagged ever reach a moderator, so precision and recall are measured on those and
+are optimistic for thresholds below the live threshold.
+"""
+import argparse
+import json
+import numpy as np
+from config import load_config
+
+
+def load_log(path):
+    scores = {} # Map from message ID to its score record
+    outcomes = {} # Map from message ID to whether a moderator found a violation
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["type"] == "score":
+                scores[record["message_id"]] = record
+            elif record["type"] == "outcome":
+                outcomes[record["message_id"]] = record["violation"]
+    return scores, outcomes
+
+
+def model_scores(scores, model):
+    if model == "live":
+        return {message_id: r["live"]["score"] for message_id, r in scores.items()}
+    return {message_id: r["candidates"][model] for message_id, r in scores.items() if model in r.get("candidates", {})}
+
+
+def calibrate(scores, outcomes, hours, thresholds):
+    """
+    This function evaluates each threshold for one model.
+    :param scores: Map from message ID to that model's score
+    :param outcomes: Map from message ID to whether a moderator found a violation
+    :param hours: The number of hours of traffic the scores cover
+    :return: list of (threshold, precision, recall, reports per hour); precision is None when nothing labeled is flagged
+    """
+    all_scores = np.array(list(scores.values()))
+    labeled = [(scores[m], violation) for m, violation in outcomes.items() if m in scores]
+    labeled_scores = np.array([s for s, _ in labeled])
+    labels = np.array([v for _, v in labeled], dtype=bool)
+    positives = labels.sum()
+    rows = []
+    for threshold in thresholds:
+        flagged = labeled_scores > threshold
+        true_positives = (flagged & labels).sum()
+        precision = true_positives / flagged.sum() if flagged.sum() else None
+        recall = true_positives / positives if positives else None
+        reports_per_hour = (all_scores > threshold).sum() / hours
+        rows.append((threshold, precision, recall, reports_per_hour))
+    return rows
+
+
+def recommend(rows, target_precision=None, max_reports_per_hour=None):
+    # Lowest threshold, i.e. the most recall, that satisfies every given constraint
+    for threshold, precision, recall, reports_per_hour in rows:
+        if target_precision != None and (precision == None or precision < target_precision):
+            continue
+        if max_reports_per_hour != None and reports_per_hour > max_reports_per_hour:
+            continue
+        return threshold
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick flagging thresholds from the shadow-mode log.")
+    parser.add_argument("--log", default=load_config()["shadow"]["log_path"])
+    parser.add_argument("--model", action="append", help="Model to evaluate (`live` or a candidate name). Defaults to all.")
+    parser.add_argument("--target-precision", type=float)
+    parser.add_argument("--max-reports-per-hour", type=float)
+    parser.add_argument("--step", type=float, default=0.05)
+    args = parser.parse_args()
+
+    scores, outcomes = load_log(args.log)
+    if not scores:
+        print(f"No scores in {args.log}. Enable shadow mode and let the bot run for a while first.")
+        return
+    times = [r["time"] for r in scores.values()]
+    hours = max((max(times) - min(times)) / 3600, 1 / 60)
+    models = args.model or ["live"] + sorted({name for r in scores.values() for name in r.get("candidates", {})})
+    thresholds = np.round(np.arange(args.step, 1, args.step), 4)
+    print(f"{len(scores)} scored messages over {hours:.1f} hours, {len(outcomes)} with moderator outcomes.\n")
+
+    for model in models:
+        rows = calibrate(model_scores(scores, model), outcomes, hours, thresholds)
+        print(f"Model `{model}`")
+        print("  threshold  precision  recall  reports/hour")
+        for threshold, precision, recall, reports_per_hour in rows:
+            precision = f"{precision:.2f}" if precision != None else "-"
+            recall = f"{recall:.2f}" if recall != None else "-"
+            print(f"  {threshold:9.2f}  {precision:>9}  {recall:>6}  {reports_per_hour:12.1f}")
+        if args.target_precision != None or args.max_reports_per_hour != None:
+            threshold = recommend(rows, args.target_precision, args.max_reports_per_hour)
+            if threshold == None:
+                print("  No threshold meets the target.")
+            else:
+                print(f"  Recommended threshold: {threshold:.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
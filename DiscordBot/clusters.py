@@ -0,0 +1,169 @@
+# clusters.py
+from collections import deque
+import hashlib
+import re
+import time
+
+
+def simhash(text):
+    """
+    This function computes a 64-bit SimHash of a message. Messages that differ by a few words get hashes that differ
+    in only a few bits.
+    :return: the hash, or None if the message is too short to compare meaningfully
+    """
+    words = re.findall(r'\w+', text.casefold())
+    if len(words) < ClusterIndex.MIN_MESSAGE_WORDS:
+        return None
+    # Words, plus word pairs so that word order counts for something
+    features = words + [" ".join(words[i:i + 2]) for i in range(len(words) - 1)]
+    weights = [0] * 64
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+class ClusterIndex:
+    """
+    Groups accounts that look like they belong to the same operator, using a union-find over user IDs. Two accounts
+    are linked when they repeatedly post near-duplicate suspicious messages (found through SimHash band buckets), and
+    optionally when they join as part of the same wave. Only flagged or high-scoring messages are indexed, since
+    ordinary greetings are near-duplicates of each other too. Each event only touches the accounts it links, so
+    clusters stay current without recomputation; links expire after link_ttl_seconds, after which the union-find is
+    rebuilt from the links that are left.
+
+    A shared avatar or look-alike name is deliberately not a link: that is what an impersonator shares with their
+    victim, so it is evidence against the offender (see report.py), not a sign that two accounts are run together.
+    Clusters are shown to moderators as context only and are never enforced against without a report.
+    """
+    MIN_MESSAGE_WORDS = 5
+    # Short messages one word apart are usually under 14 bits apart, unrelated ones around 30
+    SIMHASH_DISTANCE = 14
+    BANDS = 16 # The hash is split into this many bands; near-duplicates almost always share at least one exactly
+    BUCKET_SIZE = 64 # Recent messages remembered per band bucket
+
+    def __init__(self, settings):
+        self.join_window = settings["join_window_seconds"] # 0 turns join-wave links off
+        self.join_wave_size = settings["join_wave_size"]
+        self.min_score = settings["min_score"] # Unflagged messages scoring below this aren't indexed
+        self.min_shared_messages = settings["min_shared_messages"] # Near-duplicate pairs needed before two accounts are linked
+        self.link_ttl = settings["link_ttl_seconds"]
+        self.parent = {} # Map from user ID to its parent in the union-find
+        self.members = {} # Map from cluster root to the set of user IDs in the cluster
+        self.reasons = {} # Map from cluster root to the set of signals that linked it
+        self.links = {} # Map from (user ID, user ID) to (signal, time last seen) for every link in the union-find
+        self.near_duplicates = {} # Map from (user ID, user ID) to [count, time last seen] for pairs not linked yet
+        self.message_buckets = {} # Map from (band, band value) to recent (user ID, simhash) pairs
+        self.join_waves = {} # Map from join time bucket to the users who joined in it
+
+    def find(self, user_id):
+        if user_id not in self.parent:
+            self.parent[user_id] = user_id
+            self.members[user_id] = {user_id}
+            self.reasons[user_id] = set()
+            return user_id
+        # Path halving
+        while self.parent[user_id] != user_id:
+            self.parent[user_id] = self.parent[self.parent[user_id]]
+            user_id = self.parent[user_id]
+        return user_id
+
+    def union(self, a, b, reason):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            self.reasons[root_a].add(reason)
+            return
+        # Merge the smaller cluster into the larger one
+        if len(self.members[root_a]) < len(self.members[root_b]):
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.members[root_a] |= self.members.pop(root_b)
+        self.reasons[root_a] |= self.reasons.pop(root_b)
+        self.reasons[root_a].add(reason)
+
+    def link(self, a, b, reason, now=None):
+        now = time.time() if now == None else now
+        self.links[(min(a, b), max(a, b))] = (reason, now)
+        self.union(a, b, reason)
+
+    def cluster(self, user_id):
+        """
+        :return: (set of user IDs in the user's cluster, set of signals that linked it)
+        """
+        if user_id not in self.parent:
+            return {user_id}, set()
+        root = self.find(user_id)
+        return self.members[root], self.reasons[root]
+
+    def expire(self, now=None):
+        """
+        This function drops links not seen for link_ttl_seconds and rebuilds the clusters from the rest.
+        :return: the number of links dropped
+        """
+        now = time.time() if now == None else now
+        cutoff = now - self.link_ttl
+        for pair in [p for p, (count, seen) in self.near_duplicates.items() if seen < cutoff]:
+            del self.near_duplicates[pair]
+        expired = [pair for pair, (reason, seen) in self.links.items() if seen < cutoff]
+        if not expired:
+            return 0
+        for pair in expired:
+            del self.links[pair]
+        self.parent, self.members, self.reasons = {}, {}, {}
+        for (a, b), (reason, seen) in self.links.items():
+            self.union(a, b, reason)
+        return len(expired)
+
+    def add_join(self, user_id, joined_at):
+        if not self.join_window:
+            return
+        wave = int(joined_at.timestamp() // self.join_window)
+        # Joins arrive roughly in order, so only the current and previous waves can still grow
+        for old_wave in [w for w in self.join_waves if w < wave - 1]:
+            del self.join_waves[old_wave]
+        joined = self.join_waves.setdefault(wave, [])
+        if user_id in joined:
+            return
+        joined.append(user_id)
+        if len(joined) == self.join_wave_size:
+            for other_id in joined[1:]:
+                self.link(joined[0], other_id, "join wave")
+        elif len(joined) > self.join_wave_size:
+            self.link(joined[0], user_id, "join wave")
+
+    def add_message(self, message, score, flagged, now=None):
+        """
+        This function indexes a scored message, linking its author to accounts that have posted near-duplicates of
+        their suspicious messages at least min_shared_messages times.
+        """
+        if not flagged and score < self.min_score:
+            return
+        h = simhash(message.content)
+        if h == None:
+            return
+        now = time.time() if now == None else now
+        width = 64 // self.BANDS
+        checked = {message.author.id}
+        for band in range(self.BANDS):
+            key = (band, h >> (band * width) & ((1 << width) - 1))
+            bucket = self.message_buckets.get(key)
+            if bucket == None:
+                bucket = self.message_buckets[key] = deque(maxlen=self.BUCKET_SIZE)
+            for user_id, other in bucket:
+                if user_id not in checked and (h ^ other).bit_count() <= self.SIMHASH_DISTANCE:
+                    checked.add(user_id)
+                    self._near_duplicate(message.author.id, user_id, now)
+            bucket.append((message.author.id, h))
+
+    def _near_duplicate(self, a, b, now):
+        pair = (min(a, b), max(a, b))
+        if pair in self.links:
+            self.link(a, b, "message text", now)
+            return
+        seen = self.near_duplicates.setdefault(pair, [0, now])
+        seen[0] += 1
+        seen[1] = now
+        if seen[0] >= self.min_shared_messages:
+            del self.near_duplicates[pair]
+            self.link(a, b, "message text", now)
@@ -0,0 +1,121 @@
+# config.py
+import copy
+import json
+import os
+
+# Optional settings file in the same folder as tokens.json. Anything it leaves out keeps the default below.
+CONFIG_PATH = 'config.json'
+
+DEFAULTS = {
+    # Flagged reports are collected and posted to the mod channel as one summary per window.
+    "digest": {
+        "enabled": True,
+        "window_seconds": 60,
+        "max_samples": 5,
+        "max_offenders": 10,
+    },
+    # In-progress report and moderation flows. Idle flows are dropped after the TTL, and all state is saved to
+    # `path` every snapshot_seconds and on shutdown so flows can resume after a restart.
+    "sessions": {
+        "idle_ttl_seconds": 1800,
+        "max_sessions": 1000,
+        "snapshot_seconds": 60,
+        "path": "sessions.json",
+        # Caps on the moderation queue and the watchlist; the oldest entries are dropped first
+        "max_queued_reports": 10000,
+        "max_watchlist_users": 10000,
+        "max_watchlist_reports": 20,
+    },
+    # What discord.py caches about members. `full` keeps every Member object; `compact` keeps none and relies on
+    # the bot's own directory of IDs, names, display names and avatar keys, which is far smaller on large guilds.
+    "members": {
+        "cache": "full",
+    },
+    # tracemalloc settings for `!memory`. Tracing slows the bot down, so by default it starts on the first `!memory`.
+    "memory": {
+        "trace_at_startup": False,
+        "frames": 8,
+    },
+    # Which channels are monitored and where the mod channel is. Channels are given by ID or by name, where {group}
+    # stands for the group number. "guilds" maps a guild ID to overrides of "default" for that guild, e.g.
+    # {"1234": {"monitored": [{"channel": 5678, "threshold": 0.6, "watchlist_threshold": 0.45}]}}
+    "routing": {
+        "default": {
+            "monitored": [{"channel": "group-{group}", "threshold": 0.5, "watchlist_threshold": 0.4}],
+            "mod_channel": "group-{group}-mod",
+        },
+        "guilds": {},
+    },
+    # Auto-flagged reports at or below this classifier score are offered to moderators as low confidence.
+    "moderation": {
+        "low_confidence": 0.5,
+    },
+    # Limits on auto-report work. Flagged messages beyond a user's or channel's rate (per second, with bursts) or
+    # arriving while the queue is full are shed; past degraded_depth the avatar and image checks are skipped.
+    "admission": {
+        "max_queue": 500,
+        "workers": 2,
+        "degraded_depth": 100,
+        "user_rate": 0.2,
+        "user_burst": 3,
+        "channel_rate": 2,
+        "channel_burst": 20,
+    },
+    # Per-user activity over the last window_seconds (at most buffer_size messages per user). A user who sends
+    # burst_messages messages across at least burst_channels channels within the window is treated as bursting.
+    "velocity": {
+        "window_seconds": 30,
+        "buffer_size": 16,
+        "idle_seconds": 600,
+        "compact_every": 1000,
+        "burst_messages": 8,
+        "burst_channels": 3,
+    },
+    # Event log for offline analysis (see events.py). log_scores is `all` to log every scored message or `flagged`.
+    "events": {
+        "path": "events",
+        "flush_every": 100,
+        "log_scores": "all",
+    },
+    # SQLite database holding the full-text index searched by `!search`.
+    "search": {
+        "path": "reports.db",
+    },
+    # Account clustering. Accounts joining within the same join_window_seconds are linked once join_wave_size of them
+    # have joined; 0 turns this off, since a busy server sees unrelated joins close together.
+    # Messages are only indexed when flagged or scoring at least min_score, and two accounts are only linked after
+    # min_shared_messages near-duplicates. Links not seen again for link_ttl_seconds expire.
+    "clusters": {
+        "join_window_seconds": 0,
+        "join_wave_size": 5,
+        "min_score": 0.4,
+        "min_shared_messages": 2,
+        "link_ttl_seconds": 7 * 24 * 3600,
+    },
+    # Candidate models scored on live traffic without affecting decisions. Scores and moderator verdicts are logged
+    # to log_path for calibrate.py. Each candidate is a TF-IDF + logistic regression model, e.g.
+    # {"name": "bigrams", "ngram_range": [1, 2], "C": 1.0, "class_weight": "balanced"}
+    "shadow": {
+        "enabled": False,
+        "log_path": "shadow_log.jsonl",
+        "candidates": [],
+    },
+}
+
+
+def load_config(path=CONFIG_PATH):
+    """
+    This function loads the bot settings, filling in defaults for anything not set in the config file.
+    :param path: The path to the JSON config file
+    :return: dict of settings sections
+    """
+    config = copy.deepcopy(DEFAULTS)
+    if os.path.isfile(path):
+        with open(path) as f:
+            overrides = json.load(f)
+        for section, values in overrides.items():
+            if isinstance(values, dict) and isinstance(config.get(section), dict):
+                config[section].update(values)
+            else:
+                config[section] = values
+    return config
@@ -0,0 +1,80 @@
+# digest.py
+import asyncio
+from collections import Counter
+import discord
+
+
+def confidence_of(report):
+    """
+    This function reads the classifier confidence of a report as a number. User reports have no confidence.
+    """
+    try:
+        return float(str(report.get("Confidence", "0")).rstrip("%"))
+    except ValueError:
+        return 0.0
+
+
+class Digest:
+    """
+    Collects new reports and posts them to each guild's mod channel as one summary embed per window instead of one
+    message per report. The summary counts reports by offender and shows the highest-confidence ones with links;
+    any report in it can be opened for moderation by its report ID.
+    """
+    OPEN_KEYWORD = "!open"
+
+    def __init__(self, client, settings):
+        self.client = client
+        self.enabled = settings["enabled"]
+        self.window = settings["window_seconds"]
+        self.max_samples = settings["max_samples"]
+        self.max_offenders = settings["max_offenders"]
+        self.buffers = {} # Map from guild ID to the reports collected for it this window
+        self.task = None
+
+    def start(self):
+        if self.enabled and self.task == None:
+            self.task = asyncio.create_task(self.run())
+
+    def add(self, guild_id, report):
+        if self.enabled and guild_id != None:
+            self.buffers.setdefault(guild_id, []).append(report)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        buffers, self.buffers = self.buffers, {}
+        for guild_id, reports in buffers.items():
+            channel = self.client.mod_channels.get(guild_id)
+            if channel and reports:
+                self.client.dispatcher.notify(channel.id, embed=self.build_embed(reports))
+
+    def build_embed(self, reports):
+        embed = discord.Embed(
+            title=f"{len(reports)} new report(s) in the last {self.window} seconds",
+            colour=discord.Colour.orange(),
+        )
+
+        # Counts by offender
+        counts = Counter((r["Offending user ID"], r["Offending username"]) for r in reports)
+        lines = [f"`{name}` ({user_id}): {count}" for (user_id, name), count in counts.most_common(self.max_offenders)]
+        if len(counts) > self.max_offenders:
+            lines.append(f"...and {len(counts) - self.max_offenders} more account(s)")
+        embed.description = "**Reports by offender**\n" + "\n".join(lines)
+
+        # Highest-confidence samples
+        for report in sorted(reports, key=confidence_of, reverse=True)[:self.max_samples]:
+            name = f"#{report['Report ID']} · {report['Offending username']}"
+            if "Confidence" in report:
+                name += f" · {report['Confidence']}"
+            value = report.get("Offending message") or report.get("Abuse type", "user profile report")
+            if len(value) > 200:
+                value = value[:197] + "..."
+            if "Offending message link" in report:
+                value += f"\n[Jump to message]({report['Offending message link']})"
+            embed.add_field(name=name[:256], value=value, inline=False)
+
+        embed.set_footer(text=f"Say {self.OPEN_KEYWORD} <report ID> to moderate a report.")
+        return embed
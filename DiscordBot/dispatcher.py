@@ -0,0 +1,253 @@
+# dispatcher.py
+import asyncio
+import datetime
+import json
+import os
+import random
+import time
+import aiohttp
+import discord
+
+
+class TokenBucket:
+    """
+    Allows bursts of up to `capacity` operations, refilled at `rate` operations per second.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self, tokens=1):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class ActionDispatcher:
+    """
+    Queue for outbound moderation actions (offender DMs, bans, timeouts and mod-channel notices). Each kind of action
+    has its own worker paced to stay under the matching Discord rate limit, so a burst of decisions can't get the bot
+    throttled. Transient failures are retried with exponential backoff, and pending actions are saved to disk so they
+    survive a restart. An action can carry follow-up actions that are only queued once it is done, e.g. a ban after
+    the DM telling the user about it, which could no longer be delivered once the user shares no guild with the bot.
+    DMs sent as one group hold back their follow-ups until every DM in the group is done, so that the bans from a
+    bulk verdict reach the queue together and go out as bulk bans.
+    """
+    PENDING_PATH = "pending_actions.json"
+    MAX_ATTEMPTS = 5
+    BACKOFF_BASE = 2 # Seconds before the first retry; doubles on each attempt
+    MAX_MESSAGE_LENGTH = 2000
+    MAX_EMBEDS = 10 # Per message
+    MAX_BULK_BAN = 200 # Per bulk ban request
+
+    # (operations per second, burst size) for each route. DM channel creation is limited far more tightly than
+    # ordinary messages, and bans are limited per guild.
+    ROUTES = {
+        "dm": (0.5, 5),
+        "ban": (1, 5),
+        "timeout": (1, 5),
+        "notice": (1, 5),
+    }
+
+    def __init__(self, client):
+        self.client = client
+        self.queues = {route: asyncio.Queue() for route in self.ROUTES}
+        self.buckets = {route: TokenBucket(*limits) for route, limits in self.ROUTES.items()}
+        self.pending = [] # Every queued or in-flight action, saved to disk on change
+        self.workers = []
+
+    def start(self):
+        if self.workers:
+            return
+        groups = set()
+        for action in self.load():
+            if action.get("held"):
+                self.pending.append(action)
+                groups.add(action["held"])
+            else:
+                self._enqueue(action)
+        for group in groups:
+            self._release(group)
+        for route in self.ROUTES:
+            self.workers.append(asyncio.create_task(self._worker(route)))
+
+    def send_dm(self, user_id, content, then=(), group=None):
+        """
+        :param then: Actions (from ban_action or timeout_action) to queue once the DM has been sent or given up on
+        :param group: A group from new_group(); the follow-ups wait until every DM in the group is done
+        """
+        self._enqueue({"route": "dm", "user_id": int(user_id), "content": content, "then": list(then), "group": group})
+
+    def new_group(self):
+        return random.getrandbits(63)
+
+    def ban(self, guild_id, user_id, reason):
+        self._enqueue(self.ban_action(guild_id, user_id, reason))
+
+    def timeout(self, guild_id, user_id, days, reason):
+        self._enqueue(self.timeout_action(guild_id, user_id, days, reason))
+
+    @staticmethod
+    def ban_action(guild_id, user_id, reason):
+        return {"route": "ban", "guild_id": guild_id, "user_id": int(user_id), "reason": reason}
+
+    @staticmethod
+    def timeout_action(guild_id, user_id, days, reason):
+        until = discord.utils.utcnow() + datetime.timedelta(days=days)
+        return {"route": "timeout", "guild_id": guild_id, "user_id": int(user_id), "until": until.isoformat(), "reason": reason}
+
+    def notify(self, channel_id, content=None, embed=None):
+        embeds = [embed.to_dict()] if embed else []
+        self._enqueue({"route": "notice", "channel_id": channel_id, "content": content, "embeds": embeds})
+
+    def load(self):
+        try:
+            with open(self.PENDING_PATH) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except json.JSONDecodeError as e:
+            print(f"Ignoring unreadable {self.PENDING_PATH}: {e}")
+            return []
+
+    def save(self):
+        tmp_path = self.PENDING_PATH + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.pending, f)
+        os.replace(tmp_path, self.PENDING_PATH)
+
+    def _enqueue(self, action):
+        action.setdefault("attempts", 0)
+        self.pending.append(action)
+        self.queues[action["route"]].put_nowait(action)
+        self.save()
+
+    def _finish(self, actions):
+        # Follow-ups go ahead whether the action succeeded or not; a user with DMs closed is still banned
+        self.pending = [a for a in self.pending if not any(a is b for b in actions)]
+        for action in actions:
+            group = action.get("group")
+            for follow_up in action.get("then", []):
+                if group == None:
+                    self._enqueue(follow_up)
+                else:
+                    # Kept in the pending list (and so saved) but not queued until the group is done
+                    follow_up.setdefault("attempts", 0)
+                    follow_up["held"] = group
+                    self.pending.append(follow_up)
+            if group != None:
+                self._release(group)
+        self.save()
+
+    def _release(self, group):
+        if any(a.get("group") == group for a in self.pending):
+            return
+        for action in [a for a in self.pending if a.get("held") == group]:
+            del action["held"]
+            self.queues[action["route"]].put_nowait(action)
+
+    async def _worker(self, route):
+        queue = self.queues[route]
+        carry = None
+        while True:
+            batch = [carry or await queue.get()]
+            carry = None
+            # Take whatever else is already waiting that can go out in the same request.
+            while not queue.empty():
+                action = queue.get_nowait()
+                if not self._can_batch(batch, action):
+                    carry = action
+                    break
+                batch.append(action)
+            await self.buckets[route].acquire()
+            try:
+                await self._perform(route, batch)
+            except (discord.Forbidden, discord.NotFound) as e:
+                print(f"Dropping {route} action that can't succeed: {e}")
+            except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, discord.HTTPException) and e.status < 500 and e.status != 429:
+                    print(f"Dropping {route} action after error: {e}")
+                else:
+                    self._retry(route, batch, e)
+                    continue
+            except Exception as e:
+                print(f"Dropping {route} action after unexpected error: {e!r}")
+            self._finish(batch)
+
+    def _retry(self, route, batch, error):
+        for action in batch:
+            action["attempts"] += 1
+        if batch[0]["attempts"] >= self.MAX_ATTEMPTS:
+            print(f"Giving up on {route} action after {self.MAX_ATTEMPTS} attempts: {error}")
+            self._finish(batch)
+            return
+        self.save()
+        delay = self.BACKOFF_BASE * 2 ** (batch[0]["attempts"] - 1) * random.uniform(0.8, 1.2)
+        print(f"Retrying {route} action in {delay:.1f}s after error: {error}")
+        asyncio.get_running_loop().call_later(delay, self._requeue, route, batch)
+
+    def _requeue(self, route, batch):
+        for action in batch:
+            self.queues[route].put_nowait(action)
+
+    def _can_batch(self, batch, action):
+        first = batch[0]
+        if first["route"] == "notice":
+            # Notices for the same channel are merged into one message while they fit.
+            return (action["channel_id"] == first["channel_id"]
+                    and sum(len(a["content"] or "") + 1 for a in batch) + len(action["content"] or "") <= self.MAX_MESSAGE_LENGTH
+                    and sum(len(a["embeds"]) for a in batch) + len(action["embeds"]) <= self.MAX_EMBEDS)
+        if first["route"] == "ban":
+            # Bans in the same guild for the same reason use one bulk ban request.
+            return (action["guild_id"] == first["guild_id"] and action["reason"] == first["reason"]
+                    and len(batch) < self.MAX_BULK_BAN and hasattr(discord.Guild, "bulk_ban"))
+        return False
+
+    async def _perform(self, route, batch):
+        first = batch[0]
+        if route == "dm":
+            user = await self.client.fetch_cache.get_user(first["user_id"])
+            dm_channel = await user.create_dm()
+            await dm_channel.send(first["content"])
+        elif route == "ban":
+            guild = self.client.get_guild(first["guild_id"])
+            if not guild:
+                print(f"Dropping ban in guild {first['guild_id']} that I'm no longer in.")
+                return
+            users = [discord.Object(id=a["user_id"]) for a in batch]
+            if len(users) > 1:
+                await guild.bulk_ban(users, reason=first["reason"])
+            else:
+                await guild.ban(users[0], reason=first["reason"])
+        elif route == "timeout":
+            guild = self.client.get_guild(first["guild_id"])
+            if not guild:
+                print(f"Dropping timeout in guild {first['guild_id']} that I'm no longer in.")
+                return
+            member = guild.get_member(first["user_id"]) or await guild.fetch_member(first["user_id"])
+            await member.timeout(datetime.datetime.fromisoformat(first["until"]), reason=first["reason"])
+        elif route == "notice":
+            channel = self.client.get_channel(first["channel_id"])
+            if not channel:
+                print(f"Dropping notice for channel {first['channel_id']} that no longer exists.")
+                return
+            content = "\n".join(a["content"] for a in batch if a["content"]) or None
+            embeds = [discord.Embed.from_dict(e) for a in batch for e in a["embeds"]]
+            await channel.send(content=content, embeds=embeds)
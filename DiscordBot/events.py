@@ -0,0 +1,131 @@
+# events.py
+"""
+Append-only log of moderation events for offline analysis.
+
+Events are appended to one JSON lines file per day under events/raw/. Compacting converts each finished day to a
+Parquet file under events/parquet/date=YYYY-MM-DD/, which pandas, DuckDB or Spark can read as one partitioned
+dataset. Compact from the mod channel with `!export` or from the command line:
+
+    python events.py compact [--include-today]
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+
+# Every event has the same columns so the Parquet files share one schema; unused columns are left empty.
+COLUMNS = ["time", "type", "report_id", "guild_id", "channel_id", "message_id", "user_id", "victim_id", "score", "verdict", "detail"]
+
+
+class EventLog:
+    """
+    Buffers events in memory and appends them to the current day's file every flush_every events and on shutdown.
+    """
+    def __init__(self, settings):
+        self.path = settings["path"]
+        self.flush_every = settings["flush_every"]
+        self.log_scores = settings["log_scores"] # `all` to log every scored message, `flagged` for flagged ones only
+        self.buffer = []
+
+    def log(self, type, **fields):
+        event = dict.fromkeys(COLUMNS)
+        event.update(fields, time=time.time(), type=type)
+        self.buffer.append(event)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def log_score(self, message, score, threshold, flagged):
+        if flagged or self.log_scores == "all":
+            self.log("classifier_score", guild_id=message.guild.id, channel_id=message.channel.id, message_id=message.id,
+                     user_id=message.author.id, score=float(score), detail="flagged" if flagged else f"threshold {threshold}")
+
+    def log_report(self, report, guild_id=None):
+        victim = report.get("Victim user ID")
+        self.log("report_created", report_id=report["Report ID"], guild_id=guild_id, message_id=report.get("Offending message ID"),
+                 user_id=report["Offending user ID"], victim_id=victim if isinstance(victim, int) else None,
+                 score=float(report["Confidence"].rstrip("%")) / 100 if "Confidence" in report else None,
+                 detail=report.get("Abuse type"))
+        if "Victim match" in report:
+            self.log("avatar_match" if "profile photo" in report["Victim match"] else "name_match", report_id=report["Report ID"],
+                     user_id=report["Offending user ID"], victim_id=victim, detail=report["Victim match"])
+
+    def log_verdict(self, report, verdict):
+        self.log("verdict", report_id=report.get("Report ID"), message_id=report.get("Offending message ID"),
+                 user_id=report.get("Offending user ID"), verdict=verdict)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        os.makedirs(os.path.join(self.path, "raw"), exist_ok=True)
+        by_day = {}
+        for event in self.buffer:
+            by_day.setdefault(day_of(event["time"]), []).append(event)
+        for day, events in by_day.items():
+            with open(raw_file(self.path, day), "a") as f:
+                f.writelines(json.dumps(event) + "\n" for event in events)
+        self.buffer = []
+
+
+def day_of(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def raw_file(path, day):
+    return os.path.join(path, "raw", f"{day}.jsonl")
+
+
+def compact(path, include_today=False):
+    """
+    This function converts each day's raw event file to Parquet. Days already compacted are redone only if the raw
+    file has changed since.
+    :param path: The event log directory
+    :param include_today: Also compact today's file, which is still being appended to
+    :return: list of (day, number of events) for the days compacted
+    """
+    import pandas as pd
+
+    raw_dir = os.path.join(path, "raw")
+    if not os.path.isdir(raw_dir):
+        return []
+    today = day_of(time.time())
+    compacted = []
+    for name in sorted(os.listdir(raw_dir)):
+        day = name[:-len(".jsonl")]
+        if not name.endswith(".jsonl") or (day == today and not include_today):
+            continue
+        source = os.path.join(raw_dir, name)
+        target_dir = os.path.join(path, "parquet", f"date={day}")
+        target = os.path.join(target_dir, "events.parquet")
+        if os.path.isfile(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+            continue
+        events = pd.read_json(source, lines=True, dtype=False).reindex(columns=COLUMNS)
+        events["time"] = pd.to_datetime(events["time"], unit="s", utc=True)
+        for column in ["report_id", "guild_id", "channel_id", "message_id", "user_id", "victim_id"]:
+            events[column] = pd.to_numeric(events[column], errors="coerce").astype("Int64")
+        events["score"] = events["score"].astype("float64")
+        for column in ["type", "verdict", "detail"]:
+            events[column] = events[column].astype("string")
+        os.makedirs(target_dir, exist_ok=True)
+        events.to_parquet(target + ".tmp", index=False)
+        os.replace(target + ".tmp", target)
+        compacted.append((day, len(events)))
+    return compacted
+
+
+def main():
+    from config import load_config
+
+    parser = argparse.ArgumentParser(description="Compact the moderation event log to Parquet.")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--path", default=load_config()["events"]["path"])
+    parser.add_argument("--include-today", action="store_true")
+    args = parser.parse_args()
+
+    for day, count in compact(args.path, args.include_today):
+        print(f"{day}: {count} events")
+    print(f"Parquet dataset: {os.path.join(args.path, 'parquet')}")
+
+
+if __name__ == "__main__":
+    main()
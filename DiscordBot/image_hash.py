@@ -0,0 +1,65 @@
+# image_hash.py
+from io import BytesIO
+from PIL import Image
+
+# Two 64-bit difference hashes within this many bits of each other are treated as the same picture.
+MATCH_DISTANCE = 6
+# Near-uniform images (plain avatars, text on a flat background) hash to almost all zeros or all ones and sit within
+# MATCH_DISTANCE of each other. Only hashes with at least this many set and unset bits say enough to match on.
+MIN_BITS = 12
+
+
+def dhash(image, size=8):
+    """
+    This function computes a difference hash (dHash) of an image. The hash survives rescaling, recompression and
+    small colour changes, so a screenshot or re-upload of a picture hashes close to the original.
+    :param image: A PIL image
+    :param size: The hash is size * size bits
+    :return: the hash as an int
+    """
+    pixels = list(image.convert("L").resize((size + 1, size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def dhash_bytes(data):
+    """
+    This function decodes image bytes and hashes them. It is safe to run on a worker thread.
+    :return: the hash, or None if the bytes aren't a readable image
+    """
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image.seek(0) # First frame of animated images
+            return dhash(image)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def informative(h):
+    return MIN_BITS <= h.bit_count() <= 64 - MIN_BITS
+
+
+def load_hashes(path):
+    """
+    This function reads a file of hex-encoded hashes, one per line. Blank lines and lines starting with # are skipped.
+    :return: set of hashes, empty if the file doesn't exist
+    """
+    hashes = set()
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    hashes.add(int(line, 16))
+    except FileNotFoundError:
+        pass
+    return hashes
@@ -0,0 +1,125 @@
+# members.py
+import discord
+
+
+class MemberInfo:
+    """
+    The few fields of a member the bot uses, in place of a full discord.Member.
+    """
+    __slots__ = ("id", "name", "nick", "avatar_key", "guild_ids")
+
+    def __init__(self, id, name, display_name, avatar_key, guild_ids):
+        self.id = id
+        self.name = name
+        self.nick = display_name if display_name != name else None # Only stored when it differs from the name
+        self.avatar_key = avatar_key # Discord's hash of the member's avatar, or None for the default avatar
+        self.guild_ids = guild_ids # Tuple of the guilds the bot shares with the member
+
+    @property
+    def display_name(self):
+        return self.nick or self.name
+
+
+class MemberDirectory:
+    """
+    Compact directory of every member in the bot's guilds. The cache policy decides what discord.py keeps itself:
+    `full` caches every Member as before, while `compact` caches none of them, so this directory is the only copy.
+    Under `compact` the directory is loaded page by page over REST at startup, kept current by joins and leaves, and
+    refreshed from each message a member sends, since discord.py can't report profile updates for members it hasn't
+    cached.
+    """
+    POLICIES = ["full", "compact"]
+
+    def __init__(self, client, settings):
+        if settings["cache"] not in self.POLICIES:
+            raise ValueError(f"members.cache must be one of {self.POLICIES}, not {settings['cache']!r}")
+        self.client = client
+        self.policy = settings["cache"]
+        self.members = {} # Map from user ID to MemberInfo
+        self.by_name = {} # Map from username to user ID
+
+    def cache_flags(self):
+        return discord.MemberCacheFlags.all() if self.policy == "full" else discord.MemberCacheFlags.none()
+
+    def chunk_at_startup(self):
+        return self.policy == "full"
+
+    async def load(self, guilds):
+        for guild in guilds:
+            if self.policy == "full":
+                for member in guild.members:
+                    self.add(member)
+            else:
+                async for member in guild.fetch_members(limit=None):
+                    self.add(member)
+
+    def add(self, member):
+        """
+        This function adds a member or user to the directory, or updates their entry.
+        :param member: A discord.Member, or a discord.User for someone already in the directory
+        :return: True if the entry is new or its name, display name or avatar changed
+        """
+        avatar_key = member.avatar.key if member.avatar else None
+        guild = getattr(member, "guild", None)
+        info = self.members.get(member.id)
+        if info == None:
+            if guild == None:
+                return False
+            self.members[member.id] = MemberInfo(member.id, member.name, member.display_name, avatar_key, (guild.id,))
+            self.by_name[member.name] = member.id
+            return True
+
+        if guild != None and guild.id not in info.guild_ids:
+            info.guild_ids += (guild.id,)
+        # A User has no nickname, so its display name says nothing about the member's display name
+        display_name = member.display_name if guild != None else info.display_name
+        if (info.name, info.display_name, info.avatar_key) == (member.name, display_name, avatar_key):
+            return False
+        if self.by_name.get(info.name) == info.id:
+            del self.by_name[info.name]
+        info.name = member.name
+        info.nick = display_name if display_name != member.name else None
+        info.avatar_key = avatar_key
+        self.by_name[member.name] = member.id
+        return True
+
+    def remove(self, user_id, guild_id):
+        """
+        This function records that a member left a guild.
+        :return: True if the bot no longer shares any guild with them
+        """
+        info = self.members.get(user_id)
+        if info == None:
+            return True
+        info.guild_ids = tuple(g for g in info.guild_ids if g != guild_id)
+        if info.guild_ids:
+            return False
+        del self.members[user_id]
+        if self.by_name.get(info.name) == user_id:
+            del self.by_name[info.name]
+        return True
+
+    def get(self, user_id):
+        return self.members.get(user_id)
+
+    def find_by_name(self, name):
+        return self.members.get(self.by_name.get(name))
+
+    def in_guild(self, user_id, guild_id):
+        info = self.members.get(user_id)
+        return info != None and guild_id in info.guild_ids
+
+    def avatar(self, info):
+        """
+        This function rebuilds the avatar Asset for a directory entry so it can be downloaded.
+        :return: the Asset, or None for the default avatar
+        """
+        if info.avatar_key == None:
+            return None
+        return discord.Asset._from_avatar(self.client._connection, info.id, info.avatar_key)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(list(self.members.values()))
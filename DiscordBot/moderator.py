@@ -3,6 +3,7 @@ from enum import Enum, auto
 import discord
 from discord import User
 import re
+from digest import confidence_of
 
 class State(Enum):
     MODERATION_START = auto()
@@ -21,6 +22,13 @@ class State(Enum):
 class Moderate:
     START_KEYWORD = "!start"
     CANCEL_KEYWORD = "!cancel"
+    BULK_KEYWORD = "!bulk"
+    LOAD_KEYWORD = "!load"
+    EXPORT_KEYWORD = "!export"
+    BAN_DM = "You have been permanently banned from our service for impersonation. If you believe that there has been a mistake, you may appeal this decision by contacting the moderators at moderators@service.com."
+    SUSPEND_DM = "You have been issued a 7-day ban for impersonation. If you believe that there has been a mistake, you may appeal this decision by contacting the moderators at moderators@service.com."
+    SUSPEND_DAYS = 7
+    BULK_VERDICTS = ["ban", "suspend", "dismiss"]
 
     def __init__(self, client):
         self.state = State.MODERATION_START
@@ -29,6 +37,30 @@ class Moderate:
         self.message = None
         self.report = {}
         self.watch = ""
+        self.verdict = None # Outcome of the moderation, e.g. `ban` or `watch`
+
+    def to_snapshot(self):
+        return {
+            "state": self.state.name,
+            "report_id": self.report.get("Report ID"),
+            "offender_id": self.offender.id if self.offender else None,
+            "watch": self.watch,
+        }
+
+    @classmethod
+    def from_snapshot(cls, client, data):
+        moderation = cls(client)
+        moderation.state = State[data["state"]]
+        moderation.watch = data["watch"]
+        if data["offender_id"] != None:
+            # Only the ID is needed to act on the offender
+            moderation.offender = discord.Object(id=data["offender_id"])
+        if data["report_id"] != None:
+            moderation.report = client.find_report(str(data["report_id"]))
+            # The report was resolved by someone else in the meantime
+            if moderation.report == None:
+                return None
+        return moderation
 
     async def handle_message(self, message):
         '''
@@ -56,11 +88,11 @@ class Moderate:
                 reply += "\n" + key + ": " + str(value)
 
             # Set the offender.
-            self.offender = await self.client.fetch_user(self.report["Offending user ID"])
+            self.offender = await self.client.fetch_cache.get_user(self.report["Offending user ID"])
 
             # This was an automatically flagged message.
             if self.report["Reporter"] == "automatic bot detection":
-                if float(self.report["Confidence"][:4]) <= 0.5:
+                if confidence_of(self.report) / 100 <= self.client.config["moderation"]["low_confidence"]:
                     reply += "\n\nLow confidence score. Review anyway? Say `yes` or `no`."
                     self.state = State.AWAITING_REVIEW_LOW_CONFIDENCE
                 elif self.report["Victim user ID"] == "unknown":
@@ -76,6 +108,7 @@ class Moderate:
             # Other abuse type. Shallow implementation.
             if self.report["Abuse type"] != "impersonation":
                 reply += "\n\nLet's pretend you went through a moderation flow for this abuse type and have taken all appropriate actions. No further action is necessary."
+                self.verdict = "other abuse type"
                 self.state = State.MODERATION_COMPLETE
                 return [reply]
 
@@ -111,6 +144,7 @@ class Moderate:
         if self.state == State.AWAITING_REVIEW_LOW_CONFIDENCE:
             match message.content.lower():
                 case "yes":
+                    reply = ""
                     if self.report["Victim user ID"] == "unknown":
                         reply += "No plausible victim profile has been identified.\n"
                         reply += "After a review of the flagged user profile, is this a clear case of impersonation? Say `yes` or `no`."
@@ -121,6 +155,7 @@ class Moderate:
                         self.state = State.AWAITING_AUTO_FLAGGED_PLAUSIBLE_VIOLATION_POTENTIAL_VICTIM
                 case "no":
                     self.watch = self.report["Offending user ID"]
+                    self.verdict = "watch"
                     reply = "Watch list has been updated with this report. No further action is necessary."
                     self.state = State.MODERATION_COMPLETE
                 case _:
@@ -162,6 +197,7 @@ class Moderate:
                     self.state = State.AWAITING_MALICIOUS_DECISION
                 case "no":
                     self.watch = self.report["Offending user ID"]
+                    self.verdict = "watch"
                     reply = "Watch list has been updated with this report. No further action is necessary."
                     self.state = State.MODERATION_COMPLETE
                 case _:
@@ -175,9 +211,10 @@ class Moderate:
                     reply = "Does the impersonation seem to be for malicious purposes (as in, not satire or an open joke)? Say `yes` or `no`.\n"
                     self.state = State.AWAITING_MALICIOUS_DECISION
                 case "no":
-                    self.offender = await self.client.fetch_user(await get_member_id(self.client, self.report["Reporter"]))
+                    self.offender = await self.client.fetch_cache.get_user(await get_member_id(self.client, self.report["Reporter"]))
                     await self.send_offender_dm("You have been issued a warning for submitting a false report against `" + self.report["Offending username"] + "`for impersonation. If you believe that there has been a mistake, you may appeal this decision by contacting the moderators at moderators@service.com.")
                     reply = "A warning has been issued to the reporter about false or malicious reports. They may appeal if they believe there has been a mistake. No further action is necessary."
+                    self.verdict = "false report"
                     self.state = State.MODERATION_COMPLETE
                 case _:
                     reply = "That is not a valid response. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."
@@ -191,6 +228,7 @@ class Moderate:
                     self.state = State.AWAITING_MALICIOUS_DECISION
                 case "no":
                     reply = "Thank you for your feedback. The model will be updated. No action has been taken on the flagged user, and no further action is necessary."
+                    self.verdict = "dismiss"
                     self.state = State.MODERATION_COMPLETE
                 case _:
                     reply = "That is not a valid response. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."
@@ -216,7 +254,7 @@ class Moderate:
                 if memberID == None:
                     reply = "It seems that this user profile is not in a guild I'm in. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."
                     return [reply]
-                user = await self.client.fetch_user(memberID)
+                user = await self.client.fetch_cache.get_user(memberID)
             except discord.errors.NotFound:
                 return ["It seems that this user profile was deleted or never existed. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."]
             
@@ -234,6 +272,7 @@ class Moderate:
                     self.state = State.AWAITING_MALICIOUS_DECISION
                 case "no":
                     self.watch = self.report["Offending user ID"]
+                    self.verdict = "watch"
                     reply = "There is insufficient information to take action on the reported user. Watch list has been updated with this report. No further action is necessary."
                     self.state = State.MODERATION_COMPLETE
                 case _:
@@ -244,11 +283,13 @@ class Moderate:
         if self.state == State.AWAITING_MALICIOUS_DECISION:
             match message.content.lower():
                 case "yes":
-                    await self.send_offender_dm("You have been permanently banned from our service for impersonation. If you believe that there has been a mistake, you may appeal this decision by contacting the moderators at moderators@service.com.")
+                    enforce(self.client, self.offender.id, "ban")
+                    self.verdict = "ban"
                     reply = "A warning and permanent ban have been issued to the offender with the reason of `impersonation`. They may appeal if they believe there has been a mistake. No further action is necessary."
                     self.state = State.MODERATION_COMPLETE
                 case "no":
-                    await self.send_offender_dm("You have been issued a 7-day ban for impersonation. If you believe that there has been a mistake, you may appeal this decision by contacting the moderators at moderators@service.com.")
+                    enforce(self.client, self.offender.id, "suspend")
+                    self.verdict = "suspend"
                     reply = "A warning and 7-day ban have been issued to the offender with the reason of `impersonation`. They may appeal if they believe there has been a mistake. No further action is necessary."
                     self.state = State.MODERATION_COMPLETE
                 case _:
@@ -262,11 +303,25 @@ class Moderate:
         return self.state == State.MODERATION_CANCELLED
     
     async def send_offender_dm(self, message):
-        try:
-            dm_channel = await self.offender.create_dm()
-            await dm_channel.send(message)
-        except discord.HTTPException as e:
-            print(f"Failed to send DM to offender: {e}")
+        # Queued so that DMs are paced and retried by the dispatcher instead of failing inline.
+        self.client.dispatcher.send_dm(self.offender.id, message)
+
+def enforce(self, user_id, verdict, group=None):
+    """
+    This function queues the DM and account actions for a verdict against a user in every guild the bot moderates.
+    :param self: The bot client
+    :param user_id: The offending user's ID
+    :param verdict: `ban` for a permanent ban or `suspend` for a 7-day ban
+    :param group: A dispatcher group shared by every user in a bulk verdict, so their bans go out together
+    """
+    # The DM goes first: once banned, the user shares no guild with the bot and can't be messaged
+    if verdict == "ban":
+        bans = [self.dispatcher.ban_action(guild_id, user_id, "impersonation") for guild_id in self.mod_channels.keys()]
+        self.dispatcher.send_dm(user_id, Moderate.BAN_DM, then=bans, group=group)
+    elif verdict == "suspend":
+        timeouts = [self.dispatcher.timeout_action(guild_id, user_id, Moderate.SUSPEND_DAYS, "impersonation")
+                    for guild_id in self.mod_channels.keys() if self.members.in_guild(user_id, guild_id)]
+        self.dispatcher.send_dm(user_id, Moderate.SUSPEND_DM, then=timeouts, group=group)
 
 async def get_member_id(self, provided):
     """
@@ -275,8 +330,30 @@ async def get_member_id(self, provided):
     :param provided: The provided username of the supposed offender
     :return: member ID associated with the username
     """
-    for guild in self.guilds:
-        async for member in guild.fetch_members():
-            if provided == member.name:
-                return member.id
-    return None
\ No newline at end of file
+    member = self.members.find_by_name(provided)
+    return member.id if member else None
+
+def campaign_reports(reports, seed):
+    """
+    This function finds the reports that look like part of the same campaign as the seed report: the same offending
+    message text, or the same identified victim.
+    :param reports: The reports to search
+    :param seed: The report the campaign is built around
+    :return: list of matching reports, including the seed
+    """
+    text = normalize_message(seed.get("Offending message"))
+    victim = seed.get("Victim user ID", "unknown")
+    campaign = []
+    for report in reports:
+        if report is seed:
+            campaign.append(report)
+        elif text and normalize_message(report.get("Offending message")) == text:
+            campaign.append(report)
+        elif victim != "unknown" and report.get("Victim user ID", "unknown") == victim:
+            campaign.append(report)
+    return campaign
+
+def normalize_message(text):
+    if not text:
+        return ""
+    return " ".join(text.casefold().split())
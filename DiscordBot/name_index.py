@@ -0,0 +1,141 @@
+# name_index.py
+import unicodedata
+
+# Characters that are commonly swapped in for look-alike letters and digits. NFKC normalization already folds
+# fullwidth and most stylized letters (e.g. mathematical bold) so this only needs to cover true confusables.
+CONFUSABLES = {
+    "0": "o", "1": "l", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g",
+    "|": "l", "!": "i", "$": "s", "@": "a",
+    # Cyrillic
+    "а": "a", "в": "b", "е": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "с": "c", "т": "t",
+    "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s", "ԁ": "d", "ԛ": "q", "ԝ": "w", "ӏ": "l",
+    # Greek
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t",
+    "υ": "u", "χ": "x", "ω": "w", "γ": "y",
+}
+
+# Separators people add or drop when copying a name ("john_doe", "john.doe", "john doe").
+SEPARATORS = set(" _-.")
+
+
+def normalize_name(name):
+    """
+    This function maps a username or display name to a canonical skeleton so that look-alike names compare equal.
+    :param name: The username or display name
+    :return: the normalized skeleton of the name
+    """
+    name = unicodedata.normalize("NFKC", name).casefold()
+    skeleton = []
+    for char in unicodedata.normalize("NFKD", name):
+        # Drop accents and other combining marks left over from decomposition.
+        if unicodedata.combining(char) or char in SEPARATORS:
+            continue
+        skeleton.append(CONFUSABLES.get(char, char))
+    return "".join(skeleton)
+
+
+def edit_distance(a, b):
+    """
+    This function computes the Levenshtein distance between two strings.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def trigrams(skeleton):
+    """
+    This function lists the distinct three-character substrings of a skeleton, padded so the first and last
+    characters each start or end a trigram of their own.
+    """
+    padded = "\x02\x02" + skeleton + "\x03\x03"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Index of the normalized usernames and display names of every member the bot can see. Each distinct skeleton is
+    listed under its trigrams, so only names sharing enough trigrams with the query are compared by edit distance:
+    an edit changes at most three trigrams, so a name within k edits shares all but 3k of the query's trigrams.
+    """
+    MAX_DISTANCE = 2
+
+    def __init__(self):
+        self.skeletons = {} # Map from skeleton to the IDs of the members with that name
+        self.postings = {} # Map from trigram to the skeletons containing it
+        self.names = {} # Map from member ID to the set of skeletons indexed for that member
+
+    def add_member(self, member):
+        skeletons = {normalize_name(member.name)}
+        if member.display_name:
+            skeletons.add(normalize_name(member.display_name))
+        skeletons.discard("")
+        self.remove_member(member.id)
+        for skeleton in skeletons:
+            member_ids = self.skeletons.get(skeleton)
+            if member_ids == None:
+                member_ids = self.skeletons[skeleton] = set()
+                for gram in trigrams(skeleton):
+                    self.postings.setdefault(gram, set()).add(skeleton)
+            member_ids.add(member.id)
+        self.names[member.id] = skeletons
+
+    def remove_member(self, member_id):
+        for skeleton in self.names.pop(member_id, ()):
+            member_ids = self.skeletons.get(skeleton)
+            if member_ids == None:
+                continue
+            member_ids.discard(member_id)
+            if not member_ids:
+                del self.skeletons[skeleton]
+                for gram in trigrams(skeleton):
+                    self.postings[gram].discard(skeleton)
+                    if not self.postings[gram]:
+                        del self.postings[gram]
+
+    def nearest(self, name, max_distance=None, exclude=None):
+        """
+        This function finds the members whose names are closest to the provided name.
+        :param name: The username or display name to search for
+        :param max_distance: The largest edit distance (between normalized names) that counts as a match. Defaults to
+            one edit per four characters, up to MAX_DISTANCE, so short names don't match everything.
+        :param exclude: A member ID to leave out of the results, usually the offender
+        :return: list of (distance, member ID) pairs, closest first
+        """
+        skeleton = normalize_name(name)
+        if not skeleton:
+            return []
+        if max_distance is None:
+            max_distance = min(self.MAX_DISTANCE, len(skeleton) // 4)
+
+        if max_distance == 0:
+            candidates = [skeleton] if skeleton in self.skeletons else []
+        else:
+            grams = trigrams(skeleton)
+            needed = len(grams) - 3 * max_distance
+            if needed > 0:
+                shared = {}
+                for gram in grams:
+                    for candidate in self.postings.get(gram, ()):
+                        shared[candidate] = shared.get(candidate, 0) + 1
+                candidates = [candidate for candidate, count in shared.items() if count >= needed]
+            else:
+                # Too short for the trigram filter to rule anything out
+                candidates = list(self.skeletons)
+
+        best = {}
+        for candidate in candidates:
+            if abs(len(candidate) - len(skeleton)) > max_distance:
+                continue
+            distance = edit_distance(skeleton, candidate)
+            if distance <= max_distance:
+                for member_id in self.skeletons[candidate]:
+                    if member_id != exclude and distance < best.get(member_id, max_distance + 1):
+                        best[member_id] = distance
+        return sorted((distance, member_id) for member_id, distance in best.items())
@@ -1,10 +1,8 @@
 from enum import Enum, auto
 import discord
 import re
-import numpy as np
-import requests
-from io import BytesIO
-from PIL import Image, ImageChops
+import image_hash
+from avatar_store import same_image
 
 class State(Enum):
     BLOCK_START = auto()
@@ -47,14 +45,25 @@ class Report:
         "2": "someone I know",
         "3": "someone else"
     }
-    REPORT_INFO_DICT = {}
 
     def __init__(self, client):
         self.state = State.REPORT_START
         self.client = client
         self.message = None
+        # Per report, so that concurrent reports from different users don't overwrite each other
+        self.REPORT_INFO_DICT = {}
 
-    async def auto_report(self, message, eval):
+    def to_snapshot(self):
+        return {"state": self.state.name, "fields": dict(self.REPORT_INFO_DICT)}
+
+    @classmethod
+    def from_snapshot(cls, client, data):
+        report = cls(client)
+        report.state = State[data["state"]]
+        report.REPORT_INFO_DICT.update(data["fields"])
+        return report
+
+    async def auto_report(self, message, eval, scan=None, search_avatar=True):
         percentage_certainty = round(eval * 100, 2)
         self.REPORT_INFO_DICT["Reporter"] = "automatic bot detection"
         self.REPORT_INFO_DICT["Confidence"] = str(percentage_certainty) + "%"
@@ -64,18 +73,33 @@ class Report:
         self.REPORT_INFO_DICT["Abuse type"] = self.ABUSE_TYPES_DICT["9"]
         self.REPORT_INFO_DICT["Offending message ID"] = message.id
         self.REPORT_INFO_DICT["Offending message"] = message.content
+        self.REPORT_INFO_DICT["Offending message link"] = message.jump_url
         self.REPORT_INFO_DICT["Impersonation victim"] = self.IMPERSONATION_VICTIM_DICT["3"]
+        if scan and scan.known_bad:
+            self.REPORT_INFO_DICT["Image match"] = "known scam image"
 
         # Try to find another user with the same profile photo (avatar). That would be the possible victim.
         possible_victim = None
-        if message.author.avatar:
-            offender_avatar_url = message.author.avatar.url
-            offender_avatar = Image.open(BytesIO(requests.get(offender_avatar_url).content))
-            try:
+        if not search_avatar:
+            # Skipped while the bot is under heavy load
+            self.REPORT_INFO_DICT["Avatar search"] = "skipped"
+        elif message.author.avatar:
+            offender_avatar = await self.client.avatar_store.get(message.author.avatar)
+            if offender_avatar != None:
                 possible_victim = await search_for_matching_avatar(self.client, message.author, offender_avatar)
                 print("Finished searching for a matching profile photo.")
-            except discord.errors.NotFound:
-                return None
+            if possible_victim != None:
+                self.REPORT_INFO_DICT["Victim match"] = "matching profile photo"
+        # Next, an image in the message that reuses another member's profile photo.
+        if possible_victim == None and scan and scan.avatar_match_id != None:
+            possible_victim = self.client.members.get(scan.avatar_match_id)
+            if possible_victim != None:
+                self.REPORT_INFO_DICT["Victim match"] = "profile photo posted in message"
+        # Fall back to the closest look-alike name, e.g. "j0hn_doe" for "john_doe".
+        if possible_victim == None:
+            possible_victim = search_for_similar_name(self.client, message.author)
+            if possible_victim != None:
+                self.REPORT_INFO_DICT["Victim match"] = "similar name"
         if possible_victim == None:
             self.REPORT_INFO_DICT["Victim user ID"] = "unknown"
             self.REPORT_INFO_DICT["Victim is a real person"] = "unknown"
@@ -113,7 +137,7 @@ class Report:
                 if memberID == None:
                     reply = "It seems that this user profile is not in a guild I'm in. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."
                     return [reply]
-                user = await self.client.fetch_user(memberID)
+                user = await self.client.fetch_cache.get_user(memberID)
             except discord.errors.NotFound:
                 return ["It seems that this user profile was deleted or never existed. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."]
 
@@ -187,7 +211,7 @@ class Report:
             if not channel:
                 return ["It seems this channel was deleted or never existed. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."]
             try:
-                offending_message = await channel.fetch_message(int(m.group(3)))
+                offending_message = await self.client.fetch_cache.get_message(channel, m.group(3))
             except discord.errors.NotFound:
                 return ["It seems that this message was deleted or never existed. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."]
 
@@ -211,7 +235,7 @@ class Report:
                 if memberID == None:
                     reply = "It seems that this user profile is not in a guild I'm in. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."
                     return [reply]
-                user = await self.client.fetch_user(memberID)
+                user = await self.client.fetch_cache.get_user(memberID)
             except discord.errors.NotFound:
                 return ["It seems that this user profile was deleted or never existed. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."]
             
@@ -353,7 +377,7 @@ class Report:
                 if memberID == None:
                     reply = "It seems that this user profile is not in a guild I'm in. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel."
                     return [reply]
-                user = await self.client.fetch_user(memberID)
+                user = await self.client.fetch_cache.get_user(memberID)
             except discord.errors.NotFound:
                 reply = "It seems that this user profile was deleted or never existed. Please try again or say `" + self.CANCEL_KEYWORD + "` to cancel. Or, if you don't have the username of the person being impersonated, say `I don't know`."
                 return [reply]
@@ -447,25 +471,51 @@ async def get_member_id(self, provided):
     :param provided: The user provided username (to be reported)
     :return: member ID associated with the username
     """
-    for guild in self.guilds:
-        async for member in guild.fetch_members():
-            if provided == member.name:
-                return member.id
-    return None
+    member = self.members.find_by_name(provided)
+    return member.id if member else None
 
 
 async def search_for_matching_avatar(self, offender, offender_avatar):
-    offender_avatar_resized = offender_avatar.resize((256, 256)).convert('RGB')
-    for guild in self.guilds:
-        async for member in guild.fetch_members():
-            if member != offender and member.avatar:
-                possible_victim_avatar_url = member.avatar.url
-                possible_victim_avatar = Image.open(BytesIO(requests.get(possible_victim_avatar_url).content))
-                possible_victim_avatar_resized = possible_victim_avatar.resize((256, 256)).convert('RGB')
+    """
+    This function finds a member whose profile photo matches the offender's.
+    Candidates are picked from the avatar hashes already held in memory by the attachment scanner, and only those
+    within MATCH_DISTANCE are loaded from the avatar store for the pixel comparison. Members whose avatars haven't
+    been indexed yet are skipped.
+    :param self: The bot client
+    :param offender: The user suspected of impersonation
+    :param offender_avatar: The offender's AvatarEntry
+    :return: the matching member's MemberInfo, or None
+    """
+    for member_id, (key, avatar_hash) in list(self.attachment_scanner.avatar_hashes.items()):
+        if member_id == offender.id:
+            continue
+        # The same avatar key means the same image
+        if key != offender_avatar.key and image_hash.hamming(offender_avatar.hash, avatar_hash) > image_hash.MATCH_DISTANCE:
+            continue
+        member = self.members.get(member_id)
+        if member == None or member.avatar_key != key:
+            continue
+        if key == offender_avatar.key:
+            return member
+        possible_victim_avatar = await self.avatar_store.get(self.members.avatar(member))
+        if possible_victim_avatar != None and same_image(offender_avatar, possible_victim_avatar):
+            return member
 
-                difference = ImageChops.difference(offender_avatar_resized, possible_victim_avatar_resized)
-                mean_squared_error = np.mean(np.array(difference) ** 2)
-                if mean_squared_error < 64:
-                    return member
+    return None
 
-    return None
\ No newline at end of file
+def search_for_similar_name(self, offender):
+    """
+    This function finds the member whose username or display name most closely resembles the offender's.
+    :param self: The bot client
+    :param offender: The user or member suspected of impersonation
+    :return: the closest matching member's MemberInfo, or None if no name is similar enough
+    """
+    matches = self.name_index.nearest(offender.name, exclude=offender.id)
+    display_name = getattr(offender, "display_name", None)
+    if display_name and display_name != offender.name:
+        matches = sorted(matches + self.name_index.nearest(display_name, exclude=offender.id))
+    for distance, member_id in matches:
+        member = self.members.get(member_id)
+        if member:
+            return member
+    return None
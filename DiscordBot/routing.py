@@ -0,0 +1,85 @@
+# routing.py
+import discord
+
+MONITORED = "monitored"
+MOD = "mod"
+
+
+class Route:
+    __slots__ = ("kind", "threshold", "watchlist_threshold")
+
+    def __init__(self, kind, threshold=None, watchlist_threshold=None):
+        self.kind = kind
+        self.threshold = threshold # Classifier score above which a message is flagged
+        self.watchlist_threshold = watchlist_threshold # Lower bar for users on the watchlist
+
+
+class ChannelRouter:
+    """
+    Index from channel ID to what the bot does with messages in that channel: score them (monitored channels) or
+    run moderation flows (the mod channel). Channels are matched to the configured specs by ID or by name when they
+    are first seen, and stay routed by ID afterwards, so renaming a channel doesn't silently stop monitoring it.
+    """
+    DEFAULT_THRESHOLD = 0.5
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.group_num = None
+        self.routes = {} # Map from channel ID to Route
+        self.mod_channels = {} # Map from guild ID to the mod channel for that guild
+
+    def route(self, channel_id):
+        return self.routes.get(channel_id)
+
+    def build(self, guilds, group_num):
+        self.group_num = group_num
+        for guild in guilds:
+            self.add_guild(guild)
+
+    def add_guild(self, guild):
+        for channel in guild.text_channels:
+            self.channel_added(channel)
+
+    def remove_guild(self, guild):
+        for channel in guild.channels:
+            self.routes.pop(channel.id, None)
+        self.mod_channels.pop(guild.id, None)
+
+    def channel_added(self, channel):
+        """
+        This function routes a channel if it matches one of its guild's channel specs and isn't routed already.
+        Also called when a channel is updated, so a channel renamed to a configured name starts being routed.
+        """
+        if not isinstance(channel, discord.TextChannel) or self.group_num == None:
+            return
+        if channel.id in self.routes:
+            # Keep our reference to the mod channel current
+            if self.routes[channel.id].kind == MOD:
+                self.mod_channels[channel.guild.id] = channel
+            return
+        spec = self.guild_spec(channel.guild.id)
+        if self.matches(channel, spec["mod_channel"]):
+            self.routes[channel.id] = Route(MOD)
+            self.mod_channels[channel.guild.id] = channel
+            return
+        for monitored in spec["monitored"]:
+            if self.matches(channel, monitored["channel"]):
+                threshold = monitored.get("threshold", self.DEFAULT_THRESHOLD)
+                self.routes[channel.id] = Route(MONITORED, threshold, monitored.get("watchlist_threshold", threshold))
+                return
+
+    def channel_removed(self, channel):
+        route = self.routes.pop(channel.id, None)
+        if route and route.kind == MOD and self.mod_channels.get(channel.guild.id) == channel:
+            self.mod_channels.pop(channel.guild.id)
+
+    def guild_spec(self, guild_id):
+        spec = dict(self.settings["default"])
+        spec.update(self.settings["guilds"].get(str(guild_id), {}))
+        return spec
+
+    def matches(self, channel, target):
+        # Targets are channel IDs or channel names, where {group} stands for the group number
+        if isinstance(target, int) or str(target).isdigit():
+            return channel.id == int(target)
+        return channel.name == str(target).format(group=self.group_num)
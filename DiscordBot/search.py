@@ -0,0 +1,101 @@
+# search.py
+import json
+import re
+import sqlite3
+import time
+
+
+class ReportSearch:
+    """
+    Full-text index of every report the bot has filed, stored in SQLite with an FTS5 index over the offending
+    message, the offender's and victim's names and IDs, the abuse type and the moderator's verdict. Reports are
+    indexed when they are filed and re-indexed when a verdict is recorded, so moderators can search the whole
+    history, not just the open queue.
+    """
+    SEARCH_KEYWORD = "!search"
+    PAGE_SIZE = 5
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS reports (
+                report_id INTEGER PRIMARY KEY,
+                created REAL,
+                verdict TEXT,
+                data TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS report_index USING fts5(
+                message, offender, victim, abuse_type, reporter, verdict, tokenize = 'unicode61 remove_diacritics 2'
+            );
+        ''')
+
+    def last_report_id(self):
+        return self.db.execute("SELECT coalesce(max(report_id), 0) FROM reports").fetchone()[0]
+
+    def add(self, report):
+        self.db.execute("INSERT OR REPLACE INTO reports VALUES (?, ?, NULL, ?)", (report["Report ID"], time.time(), json.dumps(report)))
+        self._index(report["Report ID"], report, None)
+        self.db.commit()
+
+    def set_verdict(self, report, verdict):
+        if self.db.execute("SELECT 1 FROM reports WHERE report_id = ?", (report.get("Report ID"),)).fetchone() == None:
+            return
+        self.db.execute("UPDATE reports SET verdict = ? WHERE report_id = ?", (verdict, report["Report ID"]))
+        self._index(report["Report ID"], report, verdict)
+        self.db.commit()
+
+    def search(self, query, page=1):
+        """
+        This function finds the reports matching every term in the query, best matches first.
+        :param query: Free text; each word must appear in the report. A trailing * matches a prefix.
+        :param page: The page of results to return, starting at 1
+        :return: (total number of matches, list of (report, verdict) on this page)
+        """
+        match = self.match_expression(query)
+        if not match:
+            return 0, []
+        total = self.db.execute("SELECT count(*) FROM report_index WHERE report_index MATCH ?", (match,)).fetchone()[0]
+        rows = self.db.execute('''
+            SELECT r.data, r.verdict FROM report_index JOIN reports r ON r.report_id = report_index.rowid
+            WHERE report_index MATCH ? ORDER BY report_index.rank LIMIT ? OFFSET ?
+        ''', (match, self.PAGE_SIZE, (page - 1) * self.PAGE_SIZE)).fetchall()
+        return total, [(json.loads(data), verdict) for data, verdict in rows]
+
+    def format_results(self, query, page=1):
+        total, results = self.search(query, page)
+        if total == 0:
+            return f"No reports match `{query}`."
+        pages = (total + self.PAGE_SIZE - 1) // self.PAGE_SIZE
+        reply = f"{total} report(s) match `{query}` (page {page} of {pages}):"
+        for report, verdict in results:
+            reply += f"\n\n**#{report['Report ID']}** `{report.get('Offending username', 'unknown')}` ({report.get('Offending user ID')})"
+            reply += f" · {report.get('Abuse type', 'no abuse type')} · {verdict or 'open'}"
+            if report.get("Offending message"):
+                text = report["Offending message"]
+                reply += "\n> " + (text if len(text) <= 150 else text[:147] + "...").replace("\n", " ")
+        if page < pages:
+            reply += f"\n\nSay `{self.SEARCH_KEYWORD} {query} page:{page + 1}` for more."
+        return reply[:2000]
+
+    def _index(self, report_id, report, verdict):
+        self.db.execute("DELETE FROM report_index WHERE rowid = ?", (report_id,))
+        self.db.execute("INSERT INTO report_index (rowid, message, offender, victim, abuse_type, reporter, verdict) VALUES (?, ?, ?, ?, ?, ?, ?)", (
+            report_id,
+            report.get("Offending message", ""),
+            f"{report.get('Offending username', '')} {report.get('Offending user ID', '')}",
+            f"{report.get('Victim username', '')} {report.get('Victim user ID', '')}",
+            report.get("Abuse type", ""),
+            str(report.get("Reporter", "")),
+            verdict or "open",
+        ))
+
+    @staticmethod
+    def match_expression(query):
+        # Quote every term so user input can't be parsed as FTS5 syntax; keep a trailing * as a prefix search
+        terms = []
+        for term in re.findall(r'[^\s"]+', query):
+            prefix = term.endswith("*")
+            term = term.rstrip("*")
+            if term:
+                terms.append('"' + term + '"' + ("*" if prefix else ""))
+        return " ".join(terms)
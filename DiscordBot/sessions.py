@@ -0,0 +1,91 @@
+# sessions.py
+from collections import OrderedDict
+import json
+import os
+import time
+
+
+class SessionStore:
+    """
+    Map from user ID to an in-progress report or moderation flow. Flows that have been idle for longer than the TTL
+    are evicted, and once the store is full the least recently used flow is evicted to make room, so users who walk
+    away mid-flow don't hold memory forever. Sessions provide to_snapshot() so they can be saved across restarts.
+    """
+    def __init__(self, idle_ttl, max_sessions):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict() # Map from user ID to (last used time, session), least recently used first
+
+    def __contains__(self, user_id):
+        return user_id in self.sessions
+
+    def __getitem__(self, user_id):
+        session = self.sessions[user_id][1]
+        self.sessions[user_id] = (time.monotonic(), session)
+        self.sessions.move_to_end(user_id)
+        return session
+
+    def __setitem__(self, user_id, session):
+        self.sessions.pop(user_id, None)
+        while len(self.sessions) >= self.max_sessions:
+            evicted_id, _ = self.sessions.popitem(last=False)
+            print(f"Session store full; evicted the least recently used session of user {evicted_id}.")
+        self.sessions[user_id] = (time.monotonic(), session)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def pop(self, user_id, default=None):
+        entry = self.sessions.pop(user_id, None)
+        return entry[1] if entry else default
+
+    def values(self):
+        return [session for _, session in self.sessions.values()]
+
+    def evict_idle(self):
+        """
+        This function drops every session that hasn't been used within the idle TTL.
+        :return: the number of sessions evicted
+        """
+        cutoff = time.monotonic() - self.idle_ttl
+        evicted = 0
+        # Oldest entries are first, so stop at the first one that is still fresh.
+        while self.sessions:
+            user_id, (last_used, _) = next(iter(self.sessions.items()))
+            if last_used >= cutoff:
+                break
+            self.sessions.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def snapshot(self):
+        return {str(user_id): session.to_snapshot() for user_id, (_, session) in self.sessions.items()}
+
+    def restore(self, snapshot, load):
+        """
+        This function repopulates the store from a snapshot.
+        :param snapshot: A dict produced by snapshot()
+        :param load: A function turning one saved session back into a session object, or None if it can't be restored
+        """
+        for user_id, data in snapshot.items():
+            session = load(data)
+            if session != None:
+                self[int(user_id)] = session
+
+
+def save_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError as e:
+        print(f"Ignoring unreadable {path}: {e}")
+        return None
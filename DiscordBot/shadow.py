@@ -0,0 +1,82 @@
+# shadow.py
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+# Moderator verdicts that confirm a flagged message was a violation, and ones that say it wasn't.
+VIOLATION_VERDICTS = {"ban", "suspend"}
+NON_VIOLATION_VERDICTS = {"watch", "dismiss", "false report"}
+
+
+class ShadowScorer:
+    """
+    Scores live traffic with candidate models alongside the live classifier without affecting any decision.
+    Scoring and logging happen on a background thread, off the message handling path. Every score is appended to a
+    JSON lines log together with the live decision, and moderator verdicts are logged against the same message IDs,
+    so calibrate.py can compare thresholds for each model against real outcomes.
+    """
+    def __init__(self, settings):
+        self.enabled = settings["enabled"]
+        self.log_path = settings["log_path"]
+        self.specs = settings["candidates"]
+        self.candidates = {} # Map from candidate name to (vectorizer, classifier)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+
+    def train(self, X_train, y_train):
+        if not self.enabled:
+            return
+        for spec in self.specs:
+            vectorizer = TfidfVectorizer(stop_words="english", ngram_range=tuple(spec.get("ngram_range", (1, 1))))
+            classifier = LogisticRegression(C=spec.get("C", 1.0), class_weight=spec.get("class_weight"))
+            classifier.fit(vectorizer.fit_transform(X_train), y_train)
+            self.candidates[spec["name"]] = (vectorizer, classifier)
+        print(f'Trained {len(self.candidates)} shadow model(s).')
+
+    def observe(self, message, score, threshold, flagged):
+        """
+        This function queues a monitored message to be scored by every candidate model.
+        :param score: The live classifier's score
+        :param threshold: The threshold the live decision used
+        :param flagged: Whether the live decision flagged the message
+        """
+        if not self.enabled:
+            return
+        record = {
+            "type": "score",
+            "time": time.time(),
+            "message_id": message.id,
+            "user_id": message.author.id,
+            "channel_id": message.channel.id,
+            "live": {"score": float(score), "threshold": threshold, "flagged": flagged},
+        }
+        self.executor.submit(self._score, record, message.content)
+
+    def record_outcome(self, report, verdict):
+        if not self.enabled or "Offending message ID" not in report:
+            return
+        if verdict not in VIOLATION_VERDICTS and verdict not in NON_VIOLATION_VERDICTS:
+            return
+        record = {
+            "type": "outcome",
+            "time": time.time(),
+            "message_id": report["Offending message ID"],
+            "verdict": verdict,
+            "violation": verdict in VIOLATION_VERDICTS,
+        }
+        self.executor.submit(self._write, record)
+
+    def _score(self, record, text):
+        try:
+            record["candidates"] = {
+                name: float(classifier.predict_proba(vectorizer.transform([text]))[0, 1])
+                for name, (vectorizer, classifier) in self.candidates.items()
+            }
+            self._write(record)
+        except Exception as e:
+            print(f"Shadow scoring failed: {e!r}")
+
+    def _write(self, record):
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
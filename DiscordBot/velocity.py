@@ -0,0 +1,89 @@
+# velocity.py
+import time
+import numpy as np
+
+
+class Activity:
+    __slots__ = ("messages", "channels", "mean_score")
+
+    def __init__(self, messages, channels, mean_score):
+        self.messages = messages # Messages in the window, including the current one
+        self.channels = channels # Distinct channels those messages were sent in
+        self.mean_score = mean_score # Mean classifier score of those messages that were scored
+
+    def describe(self, window):
+        return f"{self.messages} message(s) in {self.channels} channel(s) in the last {window} seconds, mean score {self.mean_score:.2f}"
+
+
+class UserHistory:
+    __slots__ = ("times", "channels", "scores", "next", "last_seen")
+
+    def __init__(self, size):
+        self.times = np.full(size, -np.inf)
+        self.channels = np.zeros(size, dtype=np.int64)
+        self.scores = np.zeros(size, dtype=np.float32)
+        self.next = 0 # Slot the next message is written to; the oldest message is overwritten once full
+        self.last_seen = 0.0
+
+
+class VelocityTracker:
+    """
+    Sliding-window activity per user, kept in fixed-size ring buffers so memory per user is bounded no matter how
+    much they post. Only the most recent buffer_size messages within window_seconds count towards a user's activity.
+    A user is bursting only when they both send burst_messages messages and post in burst_channels channels within
+    the window, since a fast conversation in one channel is normal. Users who have been quiet for idle_seconds are
+    dropped every compact_every messages.
+    """
+    def __init__(self, settings):
+        self.window = settings["window_seconds"]
+        self.size = settings["buffer_size"]
+        self.idle = settings["idle_seconds"]
+        self.compact_every = settings["compact_every"]
+        self.burst_messages = settings["burst_messages"]
+        self.burst_channels = settings["burst_channels"]
+        self.users = {} # Map from user ID to UserHistory
+        self.recorded = 0
+
+    def record(self, user_id, channel_id, score, now=None):
+        """
+        This function adds a scored message to a user's history.
+        :return: the user's Activity over the window, including this message
+        """
+        now = time.time() if now == None else now
+        history = self.note(user_id, channel_id, score, now)
+        recent = history.times >= now - self.window
+        scored = recent & ~np.isnan(history.scores)
+        mean_score = float(history.scores[scored].mean()) if scored.any() else 0.0
+        return Activity(int(recent.sum()), len(np.unique(history.channels[recent])), mean_score)
+
+    def note(self, user_id, channel_id, score=None, now=None):
+        """
+        This function adds a message to a user's history without working out their activity, for messages in
+        channels that aren't monitored.
+        :param score: The message's classifier score, or None for messages that aren't scored
+        :return: the user's UserHistory
+        """
+        now = time.time() if now == None else now
+        history = self.users.get(user_id)
+        if history == None:
+            history = self.users[user_id] = UserHistory(self.size)
+        slot = history.next
+        history.times[slot] = now
+        history.channels[slot] = channel_id
+        history.scores[slot] = np.nan if score == None else score
+        history.next = (slot + 1) % self.size
+        history.last_seen = now
+
+        self.recorded += 1
+        if self.recorded % self.compact_every == 0:
+            self.compact(now)
+        return history
+
+    def bursting(self, activity):
+        return activity.messages >= self.burst_messages and activity.channels >= self.burst_channels
+
+    def compact(self, now=None):
+        now = time.time() if now == None else now
+        cutoff = now - self.idle
+        for user_id in [u for u, h in self.users.items() if h.last_seen < cutoff]:
+            del self.users[user_id]